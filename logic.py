@@ -50,7 +50,16 @@ And a few other functions:
     diff, simp       Symbolic differentiation and simplification
 """
 
-from utils import first, Expr, expr, subexpressions, extend
+import operator
+import os
+from array import array
+from collections import defaultdict
+from functools import lru_cache, reduce, wraps
+from itertools import count
+from math import prod
+from weakref import WeakValueDictionary
+
+from utils import first, Expr, expr, subexpressions
 
 
 # -----------------------------------------------------------------------------
@@ -88,15 +97,67 @@ class KB:
 
 
 class PropKB(KB):
-    """A KB for propositional logic. Inefficient, with no indexing."""
+    """A KB for propositional logic. Clauses are kept in an insertion-ordered
+    dict (clause -> the number of times it was added), so duplicates are
+    stored once and retract is O(1) per clause; a clause leaves the KB only
+    when every sentence that added it has been retracted. literal_index maps
+    each literal to the clauses that contain it.
+    Each clause is also kept in packed form for SAT routines: clause_lits
+    maps a clause to an array('i') of DIMACS-style literals, +v or -v for
+    the symbol with id v in var_ids (ids start at 1). Solvers should
+    iterate clause_lits.values() rather than walk the clause Exprs."""
 
     def __init__(self, sentence=None):
+        self.clauses = {}
+        self.literal_index = defaultdict(set)
+        self.var_ids = {}
+        self.clause_lits = {}
+        self.tseitin_clauses = {}  # Tseitin-encoded sentence -> its clauses
         super().__init__(sentence)
-        self.clauses = []
+
+    @property
+    def clauses_list(self):
+        """The KB's clauses, as a list."""
+        return list(self.clauses)
 
     def tell(self, sentence):
         """Add the sentence's clauses to the KB."""
-        self.clauses.extend(conjuncts(to_cnf(sentence)))
+        self.add_clauses(self.sentence_clauses(sentence))
+
+    def sentence_clauses(self, sentence):
+        """Return the clauses that tell adds for sentence: its CNF, or for a
+        sentence whose CNF could blow up, the equisatisfiable Tseitin
+        encoding (remembered, and reused if the sentence is told again, so
+        that retract can remove it)."""
+        sentence = expr(sentence)
+        clauses = self.tseitin_clauses.get(sentence)
+        if clauses is not None:
+            return clauses
+        if prefer_tseitin(sentence):
+            clauses = tseitin_cnf(sentence)
+            self.tseitin_clauses[sentence] = clauses
+            return clauses
+        return conjuncts(to_cnf(sentence))
+
+    def add_clauses(self, clauses):
+        """Add the clauses to the KB; a clause already in it is counted
+        again rather than stored twice."""
+        for c in clauses:
+            if c in self.clauses:
+                self.clauses[c] += 1
+                continue
+            lits = disjuncts(c)
+            self.clauses[c] = 1
+            self.clause_lits[c] = array('i', map(self.literal_id, lits))
+            for lit in lits:
+                self.literal_index[lit].add(c)
+
+    def literal_id(self, lit):
+        """Return the packed int for the literal lit: +v for a symbol with
+        id v, -v for its negation. New symbols are given the next id."""
+        if lit.op == '~':
+            return -self.literal_id(lit.args[0])
+        return self.var_ids.setdefault(lit, len(self.var_ids) + 1)
 
     def ask_generator(self, query):
         """Yield the empty substitution {} if KB entails query; else no results."""
@@ -110,14 +171,38 @@ class PropKB(KB):
         return False
 
     def retract(self, sentence):
-        """Remove the sentence's clauses from the KB."""
-        for c in conjuncts(to_cnf(sentence)):
-            if c in self.clauses:
-                self.clauses.remove(c)
+        """Remove the sentence's clauses from the KB; clauses that another
+        sentence told to the KB stay until it is retracted too.
+        >>> kb = PropKB(expr('A & B'))
+        >>> kb.tell(expr('A & C'))
+        >>> kb.retract(expr('A & B'))
+        >>> kb.clauses_list
+        [A, C]
+        """
+        clauses = self.tseitin_clauses.get(expr(sentence))
+        if clauses is None:
+            clauses = conjuncts(to_cnf(sentence))
+        self.remove_clauses(clauses)
+
+    def remove_clauses(self, clauses):
+        """Take back one addition of each of the clauses that is in the KB,
+        removing the clauses that are left with none."""
+        for c in clauses:
+            count = self.clauses.get(c)
+            if count is None:
+                continue
+            if count > 1:
+                self.clauses[c] = count - 1
+            else:
+                del self.clauses[c]
+                del self.clause_lits[c]
+                for lit in disjuncts(c):
+                    self.literal_index[lit].discard(c)
 
 
 # -----------------------------------------------------------------------------
 
+@lru_cache(maxsize=None)
 def is_prop_symbol(s):
     """A proposition logic symbol is an initial-uppercase string.
     >>> is_prop_symbol('exe')
@@ -131,7 +216,17 @@ def variables(s):
     >>> variables(expr('F(x, x) & G(x, y) & H(y, z) & R(A, z, 2)')) == {x, y, z}
     True
     """
-    return {x for x in subexpressions(s) if is_variable(x)}
+    result, seen, stack = set(), set(), [s]
+    while stack:
+        e = stack.pop()
+        if not isinstance(e, Expr) or id(e) in seen:
+            continue
+        seen.add(id(e))
+        if is_variable(e):
+            result.add(e)
+        else:
+            stack.extend(e.args)
+    return result
 
 
 # Useful constant Exprs used in examples and code:
@@ -140,43 +235,364 @@ A, B, C, D, E, F, G, P, Q, a, x, y, z, u = map(Expr, 'ABCDEFGPQaxyzu')
 
 # -----------------------------------------------------------------------------
 
-def tt_entails(kb, alpha):
+def tt_entails(kb, alpha, workers=None):
     """
     [Figure 7.10]
     Does kb entail the sentence alpha? Use truth tables. For propositional
     kb's and sentences. Note that the 'kb' should be an Expr which is a
     conjunction of clauses.
+    With workers > 1, a scan over _TT_PARALLEL_MIN or more symbols is
+    split over that many worker processes (see tt_scan_parallel); by
+    default the models are scanned in this process.
     >>> tt_entails(expr('P & Q'), expr('Q'))
     True
     """
     assert not variables(alpha)
+    combined = kb & alpha
+    symbols = list(prop_symbols(combined))
+    sym_index = {s: i for i, s in enumerate(symbols)}
+    kb_code = compile_expr(kb, sym_index)
+    alpha_code = compile_expr(alpha, sym_index)
+    n = len(symbols)
+    if n <= _TT_BITSET_MAX:
+        # Whole truth tables fit in a Python int: alpha must hold in every
+        # model (bit) where kb holds.
+        full = (1 << (1 << n)) - 1
+        columns = truth_table_columns(n)
+        return truth_table(kb_code, columns, full) & ~truth_table(alpha_code, columns, full) == 0
+    # One code array per model: kb, then a guard that ends the evaluation
+    # (True) where kb is False, then alpha.
+    code = kb_code + [(OP_GUARD, 0)] + alpha_code
+    if workers is not None and workers > 1 and n >= _TT_PARALLEL_MIN:
+        return tt_scan_parallel(code, n, workers)
+    if _load_numba():
+        return _tt_eval_range(numpy.array(code, dtype=numpy.int64), 0, 1 << n,
+                              numpy.zeros(len(code), numpy.bool_))
+    return tt_check_all(kb_code, alpha_code, 0, [None] * n)
+
+
+def tt_entails_parallel(kb, alpha, workers=None):
+    """Like tt_entails, but always scan the models in a pool of worker
+    processes (see tt_scan_parallel).
+    >>> tt_entails_parallel(expr('P & Q'), expr('Q'), workers=2)
+    True
+    """
+    assert not variables(alpha)
     symbols = list(prop_symbols(kb & alpha))
-    return tt_check_all(kb, alpha, symbols, {})
+    sym_index = {s: i for i, s in enumerate(symbols)}
+    code = compile_expr(kb, sym_index) + [(OP_GUARD, 0)] + compile_expr(alpha, sym_index)
+    return tt_scan_parallel(code, len(symbols), workers)
 
 
-def tt_check_all(kb, alpha, symbols, model):
-    """Auxiliary routine to implement tt_entails."""
-    if not symbols:
-        if pl_true(kb, model):
-            result = pl_true(alpha, model)
-            assert result in (True, False)
-            return result
+# Opcodes of the flat postfix form produced by compile_expr.
+OP_SYM, OP_NOT, OP_AND, OP_OR, OP_IMPL, OP_IFF, OP_XOR, OP_TRUE, OP_FALSE = range(9)
+# OP_GUARD pops a value and, if it is False, makes the whole code True.
+OP_GUARD = 9
+
+_compiled_ops = {'~': OP_NOT, '&': OP_AND, '|': OP_OR, '>>': OP_IMPL, '==>': OP_IMPL,
+                 '<=>': OP_IFF, '^': OP_XOR}
+
+
+def compile_expr(e, sym_index):
+    """Compile a propositional sentence into a flat postfix list of
+    (opcode, operand) pairs. A symbol compiles to (OP_SYM, sym_index[symbol]);
+    a connective follows its arguments and carries its arity as operand.
+    p << q is compiled as q >> p.
+    >>> compile_expr(expr('P & ~Q'), {P: 0, Q: 1})
+    [(0, 0), (0, 1), (1, 1), (2, 2)]
+    """
+    code = []
+
+    def emit(s):
+        if s is True or s is False:
+            code.append((OP_TRUE if s else OP_FALSE, 0))
+        elif is_prop_symbol(s.op):
+            code.append((OP_SYM, sym_index[s]))
+        elif s.op == '<<' or s.op == '<==':  # CTM implication including <<
+            emit(s.args[1])
+            emit(s.args[0])
+            code.append((OP_IMPL, 2))
+        elif s.op in _compiled_ops:
+            for arg in s.args:
+                emit(arg)
+            code.append((_compiled_ops[s.op], len(s.args)))
         else:
-            return True
+            raise ValueError('Illegal operator in logic expression' + str(s))
+
+    emit(e)
+    return code
+
+
+def pl_true_compiled(code, model_vec):
+    """Like pl_true, for code from compile_expr: model_vec[i] is the value
+    of the symbol with index i, or None if it is unknown.
+    >>> pl_true_compiled(compile_expr(expr('P | ~Q'), {P: 0, Q: 1}), [None, False])
+    True
+    """
+    stack = []
+    push, pop = stack.append, stack.pop
+    for op, arg in code:
+        if op == OP_SYM:
+            push(model_vec[arg])
+        elif op == OP_NOT:
+            p = stack[-1]
+            if p is not None:
+                stack[-1] = not p
+        elif op == OP_AND or op == OP_OR:
+            # A False argument decides &, a True one decides |.
+            decisive = op == OP_OR
+            result = decisive is False
+            if arg == 0:  # stack[-0:] would be the whole stack
+                push(result)
+                continue
+            for p in stack[-arg:]:
+                if p is decisive:
+                    result = decisive
+                    break
+                if p is None:
+                    result = None
+            del stack[-arg:]
+            push(result)
+        elif op == OP_TRUE:
+            push(True)
+        elif op == OP_FALSE:
+            push(False)
+        else:
+            q = pop()
+            p = stack[-1]
+            if op == OP_IMPL:
+                if p is False or q is True:
+                    stack[-1] = True
+                elif p is None or q is None:
+                    stack[-1] = None
+                else:
+                    stack[-1] = False
+            elif p is None or q is None:
+                stack[-1] = None
+            elif op == OP_IFF:
+                stack[-1] = p == q
+            else:
+                stack[-1] = p != q
+    return stack[0]
+
+
+# Largest number of symbols for which tt_entails evaluates whole truth tables
+# at once; a table over n symbols is a 2**n bit int.
+_TT_BITSET_MAX = 20
+
+
+def truth_table_columns(n):
+    """Return the truth tables of n symbols as 2**n bit ints: bit m of
+    column i is the value of symbol i in model m, i.e. bit i of m.
+    >>> [bin(c) for c in truth_table_columns(2)]
+    ['0b1010', '0b1100']
+    """
+    full = (1 << (1 << n)) - 1
+    return [full // ((1 << (1 << i)) + 1) << (1 << i) for i in range(n)]
+
+
+def truth_table(code, columns, full):
+    """Evaluate code from compile_expr in all models at once. columns are
+    the symbol truth tables from truth_table_columns and full is the table
+    that is true in every model; returns the truth table of the sentence."""
+    stack = []
+    for op, arg in code:
+        if op == OP_SYM:
+            stack.append(columns[arg])
+        elif op == OP_NOT:
+            stack[-1] ^= full
+        elif op == OP_AND or op == OP_OR:
+            identity = full if op == OP_AND else 0
+            if arg == 0:  # stack[-0:] would be the whole stack
+                stack.append(identity)
+                continue
+            args = stack[-arg:]
+            del stack[-arg:]
+            stack.append(reduce(operator.and_ if op == OP_AND else operator.or_, args, identity))
+        elif op == OP_TRUE:
+            stack.append(full)
+        elif op == OP_FALSE:
+            stack.append(0)
+        else:
+            q = stack.pop()
+            p = stack[-1]
+            if op == OP_IMPL:
+                stack[-1] = (p ^ full) | q
+            elif op == OP_IFF:
+                stack[-1] = p ^ q ^ full
+            else:
+                stack[-1] = p ^ q
+    return stack[0]
+
+
+def _eval_bits(code, bits, stack):
+    """Evaluate code from compile_expr (pairs, or an (n, 2) int array) in
+    the model whose symbol values are the bits of bits. stack holds
+    len(code) bools. An OP_GUARD whose operand is False ends the evaluation
+    with True. Written to compile under numba.njit."""
+    sp = 0
+    for k in range(len(code)):
+        op, arg = code[k][0], code[k][1]
+        if op == OP_SYM:
+            stack[sp] = (bits >> arg) & 1 == 1
+            sp += 1
+        elif op == OP_NOT:
+            stack[sp - 1] = not stack[sp - 1]
+        elif op == OP_AND or op == OP_OR:
+            sp -= arg
+            decisive = op == OP_OR
+            value = not decisive
+            for j in range(sp, sp + arg):
+                if stack[j] == decisive:
+                    value = decisive
+                    break
+            stack[sp] = value
+            sp += 1
+        elif op == OP_TRUE or op == OP_FALSE:
+            stack[sp] = op == OP_TRUE
+            sp += 1
+        elif op == OP_GUARD:
+            sp -= 1
+            if not stack[sp]:
+                return True
+        else:
+            sp -= 1
+            p, q = stack[sp - 1], stack[sp]
+            if op == OP_IMPL:
+                stack[sp - 1] = not p or q
+            elif op == OP_IFF:
+                stack[sp - 1] = p == q
+            else:
+                stack[sp - 1] = p != q
+    return stack[0]
+
+
+def _tt_eval_range(code, start, end, stack):
+    """Check that code (kb, OP_GUARD, alpha) holds in the models start to
+    end - 1, as bit vectors. Written to compile under numba.njit."""
+    for bits in range(start, end):
+        if not _eval_bits(code, bits, stack):
+            return False
+    return True
+
+
+# optional: numba JIT-compiles the truth-table enumeration in tt_entails. It
+# is imported on the first scan that needs it rather than with this module,
+# which most users load without ever scanning that many models.
+numpy = None
+_numba_loaded = None  # True or False once _load_numba has run
+
+
+def _load_numba():
+    """Return True if numba is installed, replacing _eval_bits and
+    _tt_eval_range with their compiled versions on the first call."""
+    global numpy, _numba_loaded, _eval_bits, _tt_eval_range
+    if _numba_loaded is None:
+        try:
+            import numpy as np
+            from numba import njit
+        except ImportError:
+            _numba_loaded = False
+        else:
+            numpy = np
+            _eval_bits = njit(cache=True)(_eval_bits)
+            _tt_eval_range = njit(cache=True)(_tt_eval_range)
+            _numba_loaded = True
+    return _numba_loaded
+
+
+# Smallest number of symbols for which tt_entails, when given workers,
+# spreads the model scan over worker processes, and the number of models a worker scans between
+# checks for a counterexample found elsewhere.
+_TT_PARALLEL_MIN = 24
+_TT_PARALLEL_BLOCK = 1 << 16
+
+_tt_counterexample_found = None  # multiprocessing.Event, in worker processes
+
+
+def tt_scan_parallel(code, n, workers=None):
+    """Check that code (kb, OP_GUARD, alpha) holds in all models of n
+    symbols, splitting the models into chunks scanned by a pool of worker
+    processes (os.cpu_count() by default). The first chunk that finds a
+    counterexample stops the others."""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    workers = workers or os.cpu_count() or 1
+    total = 1 << n
+    size = -(-total // (4 * workers))
+    found = multiprocessing.Event()
+    with ProcessPoolExecutor(workers, initializer=_tt_init_worker, initargs=(found,)) as pool:
+        futures = [pool.submit(_tt_scan_chunk, code, start, min(start + size, total))
+                   for start in range(0, total, size)]
+        for future in as_completed(futures):
+            if not future.result():
+                found.set()
+                for f in futures:
+                    f.cancel()
+                return False
+    return True
+
+
+def _tt_init_worker(found):
+    global _tt_counterexample_found
+    _tt_counterexample_found = found
+
+
+def _tt_scan_chunk(code, start, end):
+    """Worker for tt_scan_parallel: scan models start to end - 1, giving up
+    once another worker has found a counterexample."""
+    if _load_numba():
+        code = numpy.array(code, dtype=numpy.int64)
+        stack = numpy.zeros(len(code), numpy.bool_)
     else:
-        P, rest = symbols[0], symbols[1:]
-        return (tt_check_all(kb, alpha, rest, extend(model, P, True)) and
-                tt_check_all(kb, alpha, rest, extend(model, P, False)))
+        stack = [False] * len(code)
+    for block in range(start, end, _TT_PARALLEL_BLOCK):
+        if _tt_counterexample_found.is_set():
+            break
+        if not _tt_eval_range(code, block, min(block + _TT_PARALLEL_BLOCK, end), stack):
+            return False
+    return True
+
+
+def tt_check_all(kb, alpha, i, model_vec):
+    """Auxiliary routine to implement tt_entails. kb and alpha are code from
+    compile_expr; model_vec holds the values of symbols 0..i-1, and symbols
+    from i on are assigned in place and reset to None on backtracking.
+    Subtrees are pruned as soon as the partial model decides the outcome."""
+    kb_val = pl_true_compiled(kb, model_vec)
+    if kb_val is False:
+        return True  # kb is false in every completion of this model
+    alpha_val = pl_true_compiled(alpha, model_vec)
+    if alpha_val is True:
+        return True
+    if kb_val is True and alpha_val is False:
+        return False
+    # (A None kb value may still be False in every completion, so alpha
+    # being False alone does not refute entailment.)
+    assert i < len(model_vec)  # a full model decides both sentences
+    model_vec[i] = True
+    result = tt_check_all(kb, alpha, i + 1, model_vec)
+    if result:
+        model_vec[i] = False
+        result = tt_check_all(kb, alpha, i + 1, model_vec)
+    model_vec[i] = None
+    return result
 
 
 def prop_symbols(x):
-    """Return the set of all propositional symbols in x."""
-    if not isinstance(x, Expr):
-        return set()
-    elif is_prop_symbol(x.op):
-        return {x}
-    else:
-        return {symbol for arg in x.args for symbol in prop_symbols(arg)}
+    """Return the set of all propositional symbols in x. Subexpressions that
+    occur more than once (as the same object) are only walked once."""
+    result, seen, stack = set(), set(), [x]
+    while stack:
+        e = stack.pop()
+        if not isinstance(e, Expr) or id(e) in seen:
+            continue
+        seen.add(id(e))
+        if is_prop_symbol(e.op):
+            result.add(e)
+        else:
+            stack.extend(e.args)
+    return result
 
 
 def pl_true(exp, model=None):
@@ -192,89 +608,195 @@ def pl_true(exp, model=None):
 
     if exp in (True, False):
         return exp
-    op, args = exp.op, exp.args
+    op = exp.op
     if is_prop_symbol(op):
         return model.get(exp)
-    elif op == '~':
-        p = pl_true(args[0], model)
+    handler = _pl_handlers.get(op)
+    if handler is None:
+        raise ValueError('Illegal operator in logic expression' + str(exp))
+    return handler(exp.args, model)
+
+
+# pl_true for each connective, given its args and the model:
+
+def _pl_not(args, model):
+    p = pl_true(args[0], model)
+    if p is None:
+        return None
+    else:
+        return not p
+
+
+def _pl_or(args, model):
+    result = False
+    for arg in args:
+        p = pl_true(arg, model)
+        if p is True:
+            return True
         if p is None:
-            return None
-        else:
-            return not p
-    elif op == '|':
-        result = False
-        for arg in args:
-            p = pl_true(arg, model)
-            if p is True:
-                return True
-            if p is None:
-                result = None
-        return result
-    elif op == '&':
-        result = True
-        for arg in args:
-            p = pl_true(arg, model)
-            if p is False:
-                return False
-            if p is None:
-                result = None
-        return result
+            result = None
+    return result
+
+
+def _pl_and(args, model):
+    result = True
+    for arg in args:
+        p = pl_true(arg, model)
+        if p is False:
+            return False
+        if p is None:
+            result = None
+    return result
+
+
+def _pl_implies(args, model):  # CTM implication including >>
+    p, q = args
+    pt = pl_true(p, model)
+    if pt is False:
+        return True
+    qt = pl_true(q, model)
+    if qt is True:
+        return True
+    if pt is None or qt is None:
+        return None
+    return False
+
+
+def _pl_implied_by(args, model):  # CTM implication including <<
+    p, q = args
+    qt = pl_true(q, model)
+    if qt is False:
+        return True
+    pt = pl_true(p, model)
+    if pt is True:
+        return True
+    if pt is None or qt is None:
+        return None
+    return False
+
+
+def _pl_iff(args, model):
     p, q = args
-    if op == '>>' or op == '==>':      # CTM implication including >>
-        return pl_true(~p | q, model)
-    elif op == '<<' or op == '<==':    # CTM implication including <<
-        return pl_true(p | ~q, model)
     pt = pl_true(p, model)
     if pt is None:
         return None
     qt = pl_true(q, model)
     if qt is None:
         return None
-    if op == '<=>':
-        return pt == qt
-    elif op == '^':  # xor or 'not equivalent'
-        return pt != qt
-    else:
-        raise ValueError('Illegal operator in logic expression' + str(exp))
+    return pt == qt
+
+
+def _pl_xor(args, model):  # xor or 'not equivalent'
+    p, q = args
+    pt = pl_true(p, model)
+    if pt is None:
+        return None
+    qt = pl_true(q, model)
+    if qt is None:
+        return None
+    return pt != qt
+
+
+_pl_handlers = {'~': _pl_not, '|': _pl_or, '&': _pl_and,
+                '>>': _pl_implies, '==>': _pl_implies,
+                '<<': _pl_implied_by, '<==': _pl_implied_by,
+                '<=>': _pl_iff, '^': _pl_xor}
 
 
 # -----------------------------------------------------------------------------
 
+# Results of to_cnf for the last _CNF_CACHE_SIZE sentences it converted,
+# keyed on the identity of the sentence: hashing an Expr walks the whole
+# tree, which costs about as much as converting it. Entries hold on to the
+# sentence, so its id cannot be reused while it is cached.
+_CNF_CACHE_SIZE = 1024
+_cnf_cache = {}
+
+
 def to_cnf(s):
     """
     [Page 253]
     Convert a propositional logical sentence to conjunctive normal form.
     That is, to the form ((A | ~B | ...) & (B | C | ...) & ...)
+    Results are cached on the sentence object, so re-converting the same
+    sentence (as retract does) is a lookup.
     >>> to_cnf('~(B | C)')
     (~B & ~C)
     """
+    cached = _cnf_cache.get(id(s))
+    if cached is not None:
+        return cached[1]
+    sentence = s
     s = expr(s)
     if isinstance(s, str):
         s = expr(s)
-    s = eliminate_implications(s)  # Steps 1, 2 from p. 253
-    s = move_not_inwards(s)  # Step 3
-    return distribute_and_over_or(s)  # Step 4
+    s = _to_nnf(s, False, {})  # Steps 1-3 from p. 253, in one walk
+    cnf = _distribute_and_over_or(s, {})  # Step 4
+    if len(_cnf_cache) >= _CNF_CACHE_SIZE:
+        del _cnf_cache[next(iter(_cnf_cache))]  # the oldest entry
+    _cnf_cache[id(sentence)] = (sentence, cnf)
+    return cnf
+
+
+def _identity_memo(fn):
+    """Decorate a sentence transformation fn(s, memo) so that each distinct
+    subexpression object is transformed only once per memo. Subtrees that
+    are shared (e.g. the arms of an expanded <=>) are then not re-walked.
+    Entries hold on to s, so its id cannot be reused while memo is alive."""
+    @wraps(fn)
+    def memoized_fn(s, memo):
+        key = id(s)
+        if key in memo:
+            return memo[key][1]
+        result = fn(s, memo)
+        memo[key] = (s, result)
+        return result
+    return memoized_fn
+
+
+# Interned nodes built by the CNF conversion steps, keyed on op and the
+# identities of their arguments. A live node keeps its arguments alive, so
+# their ids cannot be reused while its entry exists.
+_expr_cache = WeakValueDictionary()
+
+
+def _mkexpr(op, *args):
+    """Return Expr(op, *args), reusing a live node with the same op and the
+    same argument objects if there is one. Trees built bottom-up through
+    _mkexpr are thereby maximally shared: equal subterms are the same
+    object, so the identity memos of the conversion steps see them once."""
+    key = (op,) + tuple(map(id, args))
+    e = _expr_cache.get(key)
+    if e is None:
+        e = _expr_cache[key] = Expr(op, *args)
+    return e
 
 
 def eliminate_implications(s):
     """Change implications into equivalent form with only &, |, and ~ as logical operators."""
-    s = expr(s)
+    return _eliminate_implications(expr(s), {})
+
+
+@_identity_memo
+def _eliminate_implications(s, memo):
     if not s.args or is_symbol(s.op):
         return s  # Atoms are unchanged.
-    args = list(map(eliminate_implications, s.args))
+    args = [_eliminate_implications(arg, memo) for arg in s.args]
     p, q = args[0], args[-1]
     if s.op == '>>' or s.op == '==>':
-        return q | ~p
+        return _mkexpr('|', q, _mkexpr('~', p))
     elif s.op == '<<' or s.op == '<==':
-        return p | ~q
+        return _mkexpr('|', p, _mkexpr('~', q))
     elif s.op == '<=>':
-        return (p | ~q) & (q | ~p)
+        not_p, not_q = _mkexpr('~', p), _mkexpr('~', q)
+        return _mkexpr('&', _mkexpr('|', p, not_q), _mkexpr('|', q, not_p))
     elif s.op == '^':
         assert len(args) == 2  # TODO: relax this restriction
-        return (p & ~q) | (~p & q)
+        not_p, not_q = _mkexpr('~', p), _mkexpr('~', q)
+        return _mkexpr('|', _mkexpr('&', p, not_q), _mkexpr('&', not_p, q))
     else:
         assert s.op in ('&', '|', '~')
-        return Expr(s.op, *args)
+        return _mkexpr(s.op, *args)
 
 
 def move_not_inwards(s):
@@ -282,14 +804,18 @@ def move_not_inwards(s):
     >>> move_not_inwards(~(A | B))
     (~A & ~B)
     """
-    s = expr(s)
+    return _move_not_inwards(expr(s), {})
+
+
+@_identity_memo
+def _move_not_inwards(s, memo):
     if s.op == '~':
         def NOT(b):
-            return move_not_inwards(~b)
+            return _move_not_inwards(_mkexpr('~', b), memo)
 
         a = s.args[0]
         if a.op == '~':
-            return move_not_inwards(a.args[0])  # ~~A ==> A
+            return _move_not_inwards(a.args[0], memo)  # ~~A ==> A
         if a.op == '&':
             return associate('|', list(map(NOT, a.args)))
         if a.op == '|':
@@ -298,7 +824,68 @@ def move_not_inwards(s):
     elif is_symbol(s.op) or not s.args:
         return s
     else:
-        return Expr(s.op, *list(map(move_not_inwards, s.args)))
+        return _mkexpr(s.op, *[_move_not_inwards(arg, memo) for arg in s.args])
+
+
+def to_nnf(s, neg=False):
+    """Rewrite sentence s (negated, if neg) in negation normal form: only &,
+    | and ~, with ~ applied to atoms only. This is eliminate_implications
+    followed by move_not_inwards, done in a single walk that carries the
+    pending negation down instead of building the intermediate tree.
+    >>> to_nnf(~(A >> B))
+    (~B & A)
+    """
+    return _to_nnf(expr(s), neg, {})
+
+
+def _to_nnf(s, neg, memo):
+    key = (id(s), neg)
+    if key in memo:
+        return memo[key][1]
+    op = s.op
+    if not s.args or is_symbol(op):
+        result = _mkexpr('~', s) if neg else s
+    elif op == '~':
+        result = _to_nnf(s.args[0], not neg, memo)
+    else:
+        p, q = s.args[0], s.args[-1]
+        if op == '&' or op == '|':
+            args = [_to_nnf(arg, neg, memo) for arg in s.args]
+            if neg:
+                result = associate('|' if op == '&' else '&', args)
+            else:
+                result = _mkexpr(op, *args)
+        elif op == '>>' or op == '==>':  # q | ~p
+            if neg:
+                result = associate('&', [_to_nnf(q, True, memo), _to_nnf(p, False, memo)])
+            else:
+                result = _mkexpr('|', _to_nnf(q, False, memo), _to_nnf(p, True, memo))
+        elif op == '<<' or op == '<==':  # p | ~q
+            if neg:
+                result = associate('&', [_to_nnf(p, True, memo), _to_nnf(q, False, memo)])
+            else:
+                result = _mkexpr('|', _to_nnf(p, False, memo), _to_nnf(q, True, memo))
+        else:
+            assert op in ('<=>', '^'), op
+            assert op == '<=>' or len(s.args) == 2  # TODO: relax this restriction
+            pos_p, neg_p = _to_nnf(p, False, memo), _to_nnf(p, True, memo)
+            pos_q, neg_q = _to_nnf(q, False, memo), _to_nnf(q, True, memo)
+            if op == '<=>':  # (p | ~q) & (q | ~p)
+                if neg:
+                    result = associate('|', [associate('&', [neg_p, pos_q]),
+                                             associate('&', [neg_q, pos_p])])
+                else:
+                    result = _mkexpr('&', _mkexpr('|', pos_p, neg_q),
+                                     _mkexpr('|', pos_q, neg_p))
+            else:  # (p & ~q) | (~p & q)
+                if neg:
+                    result = associate('&', [associate('|', [neg_p, pos_q]),
+                                             associate('|', [pos_p, neg_q])])
+                else:
+                    result = _mkexpr('|', _mkexpr('&', pos_p, neg_q),
+                                     _mkexpr('&', neg_p, pos_q))
+    memo[key] = (s, result)
+    return result
 
 
 def distribute_and_over_or(s):
@@ -307,26 +894,133 @@ def distribute_and_over_or(s):
     >>> distribute_and_over_or((A & B) | C)
     ((A | C) & (B | C))
     """
-    s = expr(s)
-    if s.op == '|':
-        s = associate('|', s.args)
-        if s.op != '|':
-            return distribute_and_over_or(s)
-        if len(s.args) == 0:
-            return False
-        if len(s.args) == 1:
-            return distribute_and_over_or(s.args[0])
-        conj = first(arg for arg in s.args if arg.op == '&')
-        if not conj:
-            return s
-        others = [a for a in s.args if a is not conj]
-        rest = associate('|', others)
-        return associate('&', [distribute_and_over_or(c | rest)
-                               for c in conj.args])
-    elif s.op == '&':
-        return associate('&', list(map(distribute_and_over_or, s.args)))
-    else:
+    return _distribute_and_over_or(expr(s), {})
+
+
+@_identity_memo
+def _distribute_and_over_or(s, memo):
+    if s.op == '&':
+        return associate('&', [_distribute_and_over_or(arg, memo) for arg in s.args])
+    elif s.op != '|':
         return s
+    # Distribute one conjunction at a time, over a worklist of disjunct lists
+    # rather than recursing on each (c | rest); stack order keeps the clauses
+    # in the same order as the recursive definition.
+    clauses = []
+    work = [s.args]
+    while work:
+        args = dissociate('|', work.pop())
+        for i, arg in enumerate(args):
+            if arg.op == '&':
+                others = args[:i] + args[i + 1:]
+                work.extend([c] + others for c in reversed(arg.args))
+                break
+        else:
+            clauses.append(associate('|', args))
+    return associate('&', clauses)
+
+
+# PropKB.tell Tseitin-encodes a sentence whose CNF would have more than this
+# many clauses per distinct subexpression of the sentence.
+_TSEITIN_BLOWUP = 4
+
+# Default supply of fresh auxiliary symbols for tseitin_cnf.
+_tseitin_symbols = (Expr(f'Tseitin{i}') for i in count())
+
+
+def prefer_tseitin(s):
+    """Return True if to_cnf would blow s up: its CNF has more than
+    _TSEITIN_BLOWUP clauses per distinct subexpression of s.
+    >>> prefer_tseitin('(A & B) | (C & D) | (E & F) | (G & H) | (I & J) | (K & L) | (M & N)')
+    True
+    >>> prefer_tseitin('A | (B <=> C)'), prefer_tseitin('A | (B & C)')
+    (False, False)
+    """
+    memo = {}
+    return _cnf_size(expr(s), memo)[0] > _TSEITIN_BLOWUP * len(memo)
+
+
+@_identity_memo
+def _cnf_size(s, memo):
+    """Return the number of clauses in the CNF of s and in the CNF of ~s,
+    counted as distribution produces them (before any are merged)."""
+    if not s.args or is_symbol(s.op):
+        return 1, 1
+    sizes = [_cnf_size(arg, memo) for arg in s.args]
+    if s.op == '~':
+        return sizes[0][1], sizes[0][0]
+    if s.op == '&':
+        return sum(p for p, _ in sizes), prod(n for _, n in sizes)
+    if s.op == '|':
+        return prod(p for p, _ in sizes), sum(n for _, n in sizes)
+    (p1, n1), (p2, n2) = sizes[0], sizes[-1]
+    if s.op == '>>' or s.op == '==>':
+        return n1 * p2, p1 + n2
+    if s.op == '<<' or s.op == '<==':
+        return p1 * n2, n1 + p2
+    iff = p1 * n2 + p2 * n1, p1 * p2 + n1 * n2
+    if s.op == '<=>':
+        return iff
+    if s.op == '^':
+        return iff[1], iff[0]
+    return 1, 1
+
+
+def tseitin_cnf(s, fresh=None):
+    """Return a list of clauses that is equisatisfiable with s (and entails
+    the same sentences over the symbols of s), with size linear in s.
+    The top-level conjuncts of s come first in the list, as clauses over
+    their disjuncts; a conjunct that is already a clause is kept as it is.
+    Every other compound subformula is named by a fresh symbol taken from
+    fresh, and defined by the Tseitin clauses for its connective.
+    >>> tseitin_cnf('(A & B) | C', map(Expr, ['T1', 'T2']))
+    [(T1 | C), (~T1 | A), (~T1 | B), (T1 | ~A | ~B)]
+    """
+    if fresh is None:
+        fresh = _tseitin_symbols
+    clauses = []
+    names = {}  # id(subformula) -> (subformula, literal naming it)
+
+    def literal(e):
+        if is_literal(e):
+            return e
+        key = id(e)
+        if key in names:
+            return names[key][1]
+        if e.op == '~':
+            lit = negate_literal(literal(e.args[0]))
+        else:
+            lits = [literal(arg) for arg in e.args]
+            lit = next(fresh)
+            if e.op == '&':
+                clauses.extend(~lit | l for l in lits)
+                clauses.append(associate('|', [lit] + [negate_literal(l) for l in lits]))
+            else:
+                assert e.op == '|'
+                clauses.extend(lit | negate_literal(l) for l in lits)
+                clauses.append(associate('|', [~lit] + lits))
+        names[key] = (e, lit)
+        return lit
+
+    roots = [associate('|', [literal(d) for d in disjuncts(c)])
+             for c in conjuncts(eliminate_implications(s))]
+    return roots + clauses
+
+
+def is_literal(s):
+    """A literal is a propositional symbol or its negation.
+    >>> is_literal(~A), is_literal(~~A)
+    (True, False)
+    """
+    return is_symbol(s.op) or (s.op == '~' and is_symbol(s.args[0].op))
+
+
+def negate_literal(s):
+    """Return the complement of the literal s.
+    >>> negate_literal(~A), negate_literal(A)
+    (A, ~A)
+    """
+    return s.args[0] if s.op == '~' else ~s
 
 
 def associate(op, args):
@@ -344,7 +1038,7 @@ def associate(op, args):
     elif len(args) == 1:
         return args[0]
     else:
-        return Expr(op, *args)
+        return _mkexpr(op, *args)
 
 
 _op_identity = {'&': True, '|': False, '+': 0, '*': 1}
@@ -357,15 +1051,14 @@ def dissociate(op, args):
     [A, B]
     """
     result = []
-
-    def collect(subargs):
-        for arg in subargs:
-            if arg.op == op:
-                collect(arg.args)
-            else:
-                result.append(arg)
-
-    collect(args)
+    stack = list(args)
+    while stack:
+        arg = stack.pop()
+        if arg.op == op:
+            stack.extend(arg.args)
+        else:
+            result.append(arg)
+    result.reverse()
     return result
 
 
@@ -376,11 +1069,26 @@ def conjuncts(s):
     >>> conjuncts(A | B)
     [(A | B)]
     """
+    if s.op != '&':
+        return [s]
     return dissociate('&', [s])
 
 
+def disjuncts(s):
+    """Return a list of the disjuncts in the sentence s.
+    >>> disjuncts(A | B)
+    [A, B]
+    >>> disjuncts(A & B)
+    [(A & B)]
+    """
+    if s.op != '|':
+        return [s]
+    return dissociate('|', [s])
+
+
 # -----------------------------------------------------------------------------
 
+@lru_cache(maxsize=None)
 def is_symbol(s):
     """A string s is a symbol if it starts with an alphabetic char.
     >>> is_symbol('R2D2')
@@ -16,6 +16,7 @@
 # (see http://minisat.se) SAT solver, and is directly based on the satispy
 # python project, see https://github.com/netom/satispy .
 
+from itertools import chain
 from subprocess import call
 from tempfile import NamedTemporaryFile
 import logic
@@ -46,6 +47,12 @@ def prop_symbols_from_clause_list(clause_list):
     return logic.prop_symbols(clauses_to_conjunct(clause_list))
 
 
+def int_clause_to_dimacs(lits):
+    """ DIMACS line for a clause given as non-zero ints, as in
+    logic.PropKB.clause_lits """
+    return ' '.join(map(str, lits)) + ' 0'
+
+
 # -----------------------------------------------------------------------------
 
 class AIMA_to_Dimacs_Translator(object):
@@ -60,26 +67,34 @@ class AIMA_to_Dimacs_Translator(object):
     def varobj(self, v):
         return self.varobj_dict[v]
 
-    def to_dimacs_string(self, clauses):
+    def to_dimacs_string(self, clauses, extra=()):
         """Convert AIMA cnf expression to Dimacs cnf string
         
         clauses: list of clauses in AIMA cnf
+        extra: further clauses, written after <clauses> without
+               copying the two into one list
         
         In the converted Cnf there will be only numbers for
         variable names. The conversion guarantees that the
         variables will be numbered alphabetically.
         """
+        body = self.to_dimacs_clauses(clauses, extra)
+        return 'p cnf %d %d' % (len(self.varname_dict), len(clauses) + len(extra)) + body
+
+    def to_dimacs_clauses(self, clauses, extra=()):
+        """The clause lines of to_dimacs_string, each preceded by a newline,
+        without the header. Numbers the variables as to_dimacs_string does."""
         self.varname_dict = {}
         self.varobj_dict = {}
-        variables = prop_symbols_from_clause_list(clauses)
-        ret = 'p cnf %d %d' % (len(variables), len(clauses))
+        variables = prop_symbols_from_clause_list(chain(clauses, extra))
+        ret = ''
         varis = dict(zip(sorted(variables, key=lambda v: v.op),
                          map(str, range(1, len(variables) + 1))))
         for var in varis:
             self.varname_dict[var] = varis[var]
             self.varobj_dict[varis[var]] = var
 
-        for clause in clauses:
+        for clause in chain(clauses, extra):
             ret += '\n'
             dimacs_vlist = []
             if clause.op == '|':
@@ -97,7 +112,7 @@ class AIMA_to_Dimacs_Translator(object):
 
         return ret
 
-    def to_dimacs_string_set_variable_value(self, clauses, variable, value):
+    def to_dimacs_string_set_variable_value(self, clauses, variable, value, extra=()):
         """
         Same as above, but returns dimacs for the clauses for SAT test
              with variable set to value as follows:
@@ -110,7 +125,7 @@ class AIMA_to_Dimacs_Translator(object):
         """
         self.varname_dict = {}
         self.varobj_dict = {}
-        variables = prop_symbols_from_clause_list(clauses)
+        variables = prop_symbols_from_clause_list(chain(clauses, extra))
         if variable in variables:
             variables.remove(variable)
         varis = dict(zip(sorted(variables, key=lambda v: v.op),
@@ -121,7 +136,7 @@ class AIMA_to_Dimacs_Translator(object):
 
         ret_clauses = ''
         clause_count = 0
-        for clause in clauses:
+        for clause in chain(clauses, extra):
             clause_exists = True
             dimacs_vlist = []
             ret_clause = ''
@@ -186,28 +201,46 @@ class Minisat(object):
         self.command = command
 
     def solve(self, cnf, variable = None, value = True,
-              translator = AIMA_to_Dimacs_Translator):
+              translator = AIMA_to_Dimacs_Translator, extra=()):
+        """ Test <cnf> plus the clauses in <extra> for SAT """
 
         # if there are no clauses, then can't infer anything, so by default query result is unknown
         # return Solution with success == None
         # Note that this could be treated the same as failure.
         # In PropKB_SAT.ask, this is OK as it will test if sT.success == sF.success
         #     and therefore will also return None
-        if not cnf:
+        if not cnf and not extra:
             return Solution(None)
         
-        s = Solution()
-        infile = NamedTemporaryFile(mode='w')
-        outfile = NamedTemporaryFile(mode='r')
         io = translator()
         if variable:
-            dimacs = io.to_dimacs_string_set_variable_value(cnf, variable, value)
-            if dimacs:
-                infile.write(dimacs)
-            else:
-                return s
+            dimacs = io.to_dimacs_string_set_variable_value(cnf, variable, value, extra)
+            if not dimacs:
+                return Solution()
         else:
-            infile.write(io.to_dimacs_string(cnf))
+            dimacs = io.to_dimacs_string(cnf, extra)
+        return self.run(dimacs, io)
+
+    def solve_int_assumptions(self, dimacs_clauses, num_vars, assumptions):
+        """ Test <dimacs_clauses> for SAT once per int literal in
+        <assumptions>, with that literal added as a unit clause.
+        <dimacs_clauses> are DIMACS clause lines (see int_clause_to_dimacs)
+        over variables 1..<num_vars>.
+        Returns a list with a Solution for each assumption;
+        their varmaps are keyed by variable number. """
+        if not dimacs_clauses:
+            return [Solution(None) for _ in assumptions]
+        header = 'p cnf %d %d\n' % (num_vars, len(dimacs_clauses) + 1)
+        body = '\n'.join(dimacs_clauses)
+        return [self.run('%s%s\n%d 0' % (header, body, lit)) for lit in assumptions]
+
+    def run(self, dimacs, io=None):
+        """ Run minisat on the <dimacs> string translated by <io>
+        (None if the variables need no translating back) """
+        s = Solution()
+        infile = NamedTemporaryFile(mode='w')
+        outfile = NamedTemporaryFile(mode='r')
+        infile.write(dimacs)
         infile.flush()
         ret = call(self.command % (infile.name, outfile.name), shell=True)
         infile.close()
@@ -221,7 +254,7 @@ class Minisat(object):
                 v = v.strip()
                 value = v[0] != '-'
                 v = v.lstrip('-')
-                vo = io.varobj(v)
+                vo = io.varobj(v) if io is not None else int(v)
                 s.varmap[vo] = value
 
         outfile.close()
@@ -22,14 +22,41 @@ import wumpus_kb
 import wumpus_environment
 import wumpus_planners
 import minisat as msat
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import chain, count, islice, product
 from time import perf_counter
 
+try:  # optional: python-sat keeps one incremental solver per KB
+    from pysat.solvers import Glucose3
+except ImportError:
+    Glucose3 = None
+
+# logic.expr, with each string parsed only once
+_expr = lru_cache(maxsize=8192)(logic.expr)
+
+
+def _query_workers():
+    """ Number of threads that share each batch of KB queries, from the
+    environment variable WUMPUS_QUERY_WORKERS; by default, or if it is not
+    a positive number, 1: queries are answered in turn """
+    try:
+        return max(1, int(os.environ.get('WUMPUS_QUERY_WORKERS', 1)))
+    except ValueError:
+        return 1
+
+
+QUERY_WORKERS = _query_workers()
+
 
 # -------------------------------------------------------------------------------
 
 def minisat(clauses, query=None, variable=None, value=True, verbose=False):
     """ Interface to minisat
     <query> is simply added as to the list of <clauses>
+    (without copying <clauses>)
     
     Set <variable> to a particular <value> in order to test SAT
     assuming any instance of that variable has that value.
@@ -38,38 +65,242 @@ def minisat(clauses, query=None, variable=None, value=True, verbose=False):
     """
     if verbose:
         print(f'minisat({query}):', end='')
-    if not query:
-        c = clauses
-    else:
-        c = clauses + [query]
     m = msat.Minisat()
-    s = m.solve(c, variable, value)
+    s = m.solve(clauses, variable, value, extra=[query] if query else ())
     if verbose:
         print(s.success)
     return s
 
 
+# -------------------------------------------------------------------------------
+# CNF templates for the temporal axioms
+#
+# The temporal axiom families have the same structure at every time step.
+# Each family is generated and converted to CNF once, at the sentinel time
+# _TIME_SENTINEL; the clauses for time t are then made by renaming symbols:
+# a symbol whose name ends in a number within _TIME_SPAN of the sentinel
+# is time-stamped (e.g. t or t+1) and is restamped relative to t.
+# Symbols naming Tseitin subformulas get fresh names in every instance.
+
+_TIME_SENTINEL = 10 ** 6
+_TIME_SPAN = 10
+_CNF_TEMPLATES = dict()  # (generator, args) -> (clauses, symbol renaming)
+
+_template_aux_symbols = (logic.Expr(f'TemplateAux{i}') for i in count())
+_aux_symbols = (logic.Expr(f'Aux{i}') for i in count())
+
+
+def cnf_template(sentences):
+    """ CNF clauses of <sentences>, generated at _TIME_SENTINEL, and a dict
+    from each symbol in them to (name prefix, time offset), or to None for a
+    Tseitin symbol """
+    clauses = []
+    for sentence in filter(None, sentences):
+        if logic.prefer_tseitin(sentence):
+            clauses.extend(logic.tseitin_cnf(sentence, _template_aux_symbols))
+        else:
+            clauses.extend(logic.conjuncts(logic.to_cnf(sentence)))
+    renaming = dict()
+    for symbol in msat.prop_symbols_from_clause_list(clauses):
+        prefix, stamp = re.fullmatch(r'(.*?)(\d*)', symbol.op).groups()
+        if prefix.startswith('TemplateAux'):
+            renaming[symbol] = None
+        elif stamp and abs(int(stamp) - _TIME_SENTINEL) <= _TIME_SPAN:
+            renaming[symbol] = (prefix, int(stamp) - _TIME_SENTINEL)
+    return clauses, renaming
+
+
+def temporal_axiom_clauses(generator, t, *args):
+    """ The CNF clauses of generator(t, *args); only the first call for a
+    generator and args converts to CNF, later calls rename its template """
+    key = (generator, args)
+    if key not in _CNF_TEMPLATES:
+        _CNF_TEMPLATES[key] = cnf_template(generator(_TIME_SENTINEL, *args))
+    clauses, renaming = _CNF_TEMPLATES[key]
+    symbols = {symbol: next(_aux_symbols) if stamp is None
+               else logic.Expr(f'{stamp[0]}{t + stamp[1]}')
+               for symbol, stamp in renaming.items()}
+
+    def literal(lit):
+        if lit.op == '~':
+            return ~symbols.get(lit.args[0], lit.args[0])
+        return symbols.get(lit, lit)
+
+    return [logic.associate('|', map(literal, logic.disjuncts(clause)))
+            for clause in clauses]
+
+
 # -------------------------------------------------------------------------------
 
 class PropKB_SAT(logic.PropKB):
 
+    def __init__(self, sentence=None):
+        # Answers from ask_many. Telling a consistent KB more can only settle
+        # a query that was unknown, so tell forgets just the unknown (None)
+        # answers. An inconsistent KB answers None to everything, so ask_many
+        # checks (once per version) that the KB is still consistent before it
+        # uses the known answers. retract forgets them all.
+        self._known = {}
+        self._unknown = {}
+        self.version = 0  # bumped whenever sentences are told or retracted
+        self._consistent_version = 0  # the last version found consistent
+        # The KB's packed clauses (clause_lits, over the ids in var_ids) are
+        # passed on as they are added: with python-sat, to one solver per KB
+        # that is asked under assumptions; otherwise to DIMACS lines for the
+        # minisat binary, which is run on them for each batch of queries.
+        self._solver = Glucose3() if Glucose3 is not None else None
+        self._worker_solvers = []  # with QUERY_WORKERS > 1: one per extra thread
+        self._dimacs_clauses = []
+        self._pushed = 0  # number of clauses passed on
+        super(PropKB_SAT, self).__init__(sentence)
+
     def tell(self, sentence):
-        if sentence: super(PropKB_SAT, self).tell(sentence)
+        if sentence:
+            super(PropKB_SAT, self).tell(sentence)
+            self._unknown.clear()
+            self.version += 1
+
+    def tell_many(self, sentences):
+        """ tell each of <sentences>, skipping empty ones, as one bulk add """
+        clauses = map(self.sentence_clauses, filter(None, sentences))
+        self.tell_clauses(chain.from_iterable(clauses))
+
+    def tell_clauses(self, clauses):
+        """ Add clauses that are already in CNF """
+        self.add_clauses(clauses)
+        self._unknown.clear()
+        self.version += 1
+
+    def retract(self, sentence):
+        super(PropKB_SAT, self).retract(sentence)
+        self._known.clear()
+        self._unknown.clear()
+        self.version += 1
+        # clauses cannot be taken back from the solver, so start afresh
+        if self._solver is not None:
+            self._solver.delete()
+            self._solver = Glucose3()
+        for solver in self._worker_solvers:
+            solver.delete()
+        self._worker_solvers = []
+        self._dimacs_clauses = []
+        self._pushed = 0
 
     def load_sentences(self, sentences):
-        for sentence in sentences:
-            self.tell(sentence)
+        self.tell_many(sentences)
 
     def ask(self, query):
         """ Assumes query is a single positive proposition """
         if isinstance(query, str):
-            query = logic.expr(query)
-        s_true = minisat(self.clauses, None, variable=query, value=True, verbose=False)
-        s_false = minisat(self.clauses, None, variable=query, value=False, verbose=False)
-        if s_true.success == s_false.success:
-            return None
+            query = _expr(query)
+        return self.ask_many([query])[query]
+
+    def ask_many(self, queries):
+        """ ask each of <queries> (single positive propositions) in one
+        solver session.
+        Returns a dict from each query to True, False or None """
+        queries = [_expr(q) if isinstance(q, str) else q for q in queries]
+        if self._known and self._consistent_version != self.version:
+            if not self._consistent():
+                self._known.clear()
+            self._consistent_version = self.version
+        results = {}
+        to_solve = []
+        for query in queries:
+            if query in self._known:
+                results[query] = self._known[query]
+            elif query in self._unknown:
+                results[query] = None
+            else:
+                to_solve.append(query)
+        outcomes = self._solve_both_ways(to_solve)
+        for query, s_true, s_false in zip(to_solve, outcomes[::2], outcomes[1::2]):
+            if s_true == s_false:
+                results[query] = self._unknown[query] = None
+            else:
+                results[query] = self._known[query] = s_true
+        return {query: results[query] for query in queries}
+
+    def _push_new_clauses(self):
+        """ Pass the clauses added since the last call on to the solvers, or
+        to the DIMACS lines for minisat """
+        new = len(self.clause_lits) - self._pushed
+        new_clauses = reversed(list(islice(reversed(self.clause_lits.values()), new)))
+        self._pushed += new
+        if self._solver is None:
+            self._dimacs_clauses.extend(map(msat.int_clause_to_dimacs, new_clauses))
         else:
-            return s_true.success
+            new_clauses = [clause.tolist() for clause in new_clauses]
+            for solver in [self._solver] + self._worker_solvers:
+                for clause in new_clauses:
+                    solver.add_clause(clause)
+
+    def _consistent(self):
+        """ Whether the KB's clauses are satisfiable """
+        self._push_new_clauses()
+        if self._solver is not None:
+            return self._solver.solve()
+        if not self._dimacs_clauses:
+            return True
+        header = 'p cnf %d %d\n' % (len(self.var_ids), len(self._dimacs_clauses))
+        return msat.Minisat().run(header + '\n'.join(self._dimacs_clauses)).success
+
+    def _solve_both_ways(self, queries):
+        """ SAT outcome of the KB with each query assumed True, then False """
+        self._push_new_clauses()
+        lits = list(map(self._lit_of, queries))
+        if QUERY_WORKERS > 1 and len(lits) > 1:
+            # independent queries: each thread takes a slice, with its own
+            # solver (or minisat process)
+            size = -(-len(lits) // QUERY_WORKERS)
+            chunks = [lits[i:i + size] for i in range(0, len(lits), size)]
+            solvers = [self._solver] + self._extra_solvers(len(chunks) - 1)
+            with ThreadPoolExecutor(len(chunks)) as pool:
+                parts = list(pool.map(self._outcomes, chunks, solvers))
+            return list(chain.from_iterable(parts))
+        return self._outcomes(lits, self._solver)
+
+    def _lit_of(self, query):
+        """ The int literal of a query proposition: a direct var_ids lookup
+        for a known symbol; strings are parsed first (the slow path) """
+        if isinstance(query, str):
+            query = _expr(query)
+        lit = self.var_ids.get(query)
+        return self.literal_id(query) if lit is None else lit
+
+    def _extra_solvers(self, n):
+        """ Solvers for <n> threads besides the one using the KB's solver
+        (None for each if there is no solver). They are kept, and given new
+        clauses along with the KB's solver, so only the first batch that
+        needs one builds it from all of the clauses. """
+        if self._solver is None:
+            return [None] * n
+        while len(self._worker_solvers) < n:
+            self._worker_solvers.append(Glucose3(
+                bootstrap_with=[lits.tolist() for lits in self.clause_lits.values()]))
+        return self._worker_solvers[:n]
+
+    def _outcomes(self, lits, solver):
+        """ SAT outcomes for the int literals <lits>, each assumed True then
+        False, from <solver> or, if it is None, the minisat binary """
+        if solver is None:
+            assumptions = []
+            for lit in lits:
+                assumptions += [lit, -lit]
+            solutions = msat.Minisat().solve_int_assumptions(
+                self._dimacs_clauses, len(self.var_ids), assumptions)
+            return [s.success for s in solutions]
+        solve, propagate = solver.solve, solver.propagate
+
+        def satisfiable(lit):
+            # unit propagation alone refutes many assumptions; only those it
+            # cannot refute need a full solve
+            return propagate(assumptions=[lit])[0] and solve(assumptions=[lit])
+
+        outcomes = []
+        for lit in lits:
+            outcomes += [satisfiable(lit), satisfiable(-lit)]
+        return outcomes
 
 
 # -------------------------------------------------------------------------------
@@ -92,22 +323,27 @@ class Proposition(agents.Thing):
 class HybridWumpusAgent(wumpus_environment.Explorer):
     "An agent for the wumpus world that does logical inference. [Fig. 7.19]"""
     def __init__(self, heading='east', environment=None, verbose=True, keep_axioms=True):
-        self.keep_axioms = keep_axioms  # for debugging: if True, keep easier-to-read PL form
+        # for debugging: if True, keep easier-to-read PL form in kb.axioms;
+        # only honoured when verbose, so keep_axioms implies verbose
+        self.keep_axioms = keep_axioms and verbose
 
         self.plan = None
         self.unvisited = None
+        self._cells = None
         self.kb = None
         self.number_of_clauses_over_epochs = None
         self.belief_loc_query_times = None
+        self._ok_scan = None
 
         super(HybridWumpusAgent, self).__init__(self.agent_program, heading, environment, verbose)
 
     def reset(self):
         super(HybridWumpusAgent, self).reset()
         self.plan = list()
-        self.unvisited = [(x,y)
-                          for x in range(1, self.width + 1)
-                          for y in range(1, self.height + 1)]
+        # every (x, y) location, in the order the location scans use
+        self._cells = tuple(product(range(1, self.width + 1), range(1, self.height + 1)))
+        self.unvisited = set(self._cells)
+        self._ok_scan = None
         self.kb = self.create_wumpus_KB()
         if self.verbose:
             self.number_of_clauses_over_epochs = list()
@@ -116,6 +352,17 @@ class HybridWumpusAgent(wumpus_environment.Explorer):
             # as the KB grows.
             self.belief_loc_query_times = list()
 
+    # Query Exprs for each location, each string parsed once (see _expr)
+
+    def _get_ok_expr(self, x, y, t):
+        return _expr(wumpus_kb.state_OK_str(x, y, t))
+
+    def _get_loc_expr(self, x, y, t):
+        return _expr(wumpus_kb.state_loc_str(x, y, t))
+
+    def _get_wumpus_expr(self, x, y):
+        return _expr(wumpus_kb.wumpus_str(x, y))
+
     def create_wumpus_KB(self):
         start_time = None
         if self.verbose:
@@ -127,8 +374,7 @@ class HybridWumpusAgent(wumpus_environment.Explorer):
             start_time = perf_counter()  # clock()
             print(f"    total number of axioms={len(axioms)}")
         kb = PropKB_SAT()
-        for sentence in axioms:
-            kb.tell(sentence)
+        kb.tell_many(axioms)
         if self.keep_axioms:
             kb.axioms = axioms
         if self.verbose:
@@ -143,54 +389,68 @@ class HybridWumpusAgent(wumpus_environment.Explorer):
             print(f"   HWA.make_percept_sentence(): {sentence}")
         return sentence
 
-    def add_temporal_axioms(self):
+    def _temporal_axiom_sentences(self):
         ax_so_far = None
-        if self.verbose:
-            print("       HWA.add_temporal_axioms()")
         axioms = wumpus_kb.generate_square_OK_axioms(self.time, 1, self.width, 1, self.height)
         if self.verbose:
             ax_so_far = len(axioms)
             print(f"           number of location_OK axioms:         {ax_so_far}")
-        axioms += wumpus_kb.generate_breeze_percept_and_location_axioms(self.time, 1, self.width, 1, self.height)
-        axioms += wumpus_kb.generate_stench_percept_and_location_axioms(self.time, 1, self.width, 1, self.height)
+        axioms.extend(wumpus_kb.generate_breeze_percept_and_location_axioms(self.time, 1, self.width, 1, self.height))
+        axioms.extend(wumpus_kb.generate_stench_percept_and_location_axioms(self.time, 1, self.width, 1, self.height))
         if self.verbose:
             new_ax_so_far = len(axioms)
             perc_to_loc = new_ax_so_far - ax_so_far
             print(f"           number of percept_to_loc axioms:      {perc_to_loc}")
             ax_so_far = new_ax_so_far
-        axioms += wumpus_kb.generate_at_location_ssa(self.time, self.belief_location[0],
-                                                     self.belief_location[1],
-                                                     1, self.width, 1, self.height,
-                                                     self.heading_str(self.belief_heading))
+        axioms.extend(wumpus_kb.generate_at_location_ssa(self.time, self.belief_location[0],
+                                                         self.belief_location[1],
+                                                         1, self.width, 1, self.height,
+                                                         self.heading_str(self.belief_heading)))
         if self.verbose:
             new_ax_so_far = len(axioms)
             local_loc_at = new_ax_so_far - ax_so_far
             print(f"           number of at_location ssa axioms:     {local_loc_at}")
             ax_so_far = new_ax_so_far
-        axioms += wumpus_kb.generate_non_location_ssa(self.time)
+        axioms.extend(wumpus_kb.generate_non_location_ssa(self.time))
         if self.verbose:
             new_ax_so_far = len(axioms)
             remaining_ssa_at_time = new_ax_so_far - ax_so_far
             print(f"           number of non-location ssa axioms:    {remaining_ssa_at_time}")
             ax_so_far = new_ax_so_far
-        axioms += wumpus_kb.generate_mutually_exclusive_axioms(self.time)
+        axioms.extend(wumpus_kb.generate_mutually_exclusive_axioms(self.time))
         if self.verbose:
             new_ax_so_far = len(axioms)
             mutually_exclusive = new_ax_so_far - ax_so_far
             print(f"           number of mutually_exclusive axioms:  {mutually_exclusive}")
-        
-        if self.verbose:
             print(f"       Total number of axioms being added:  {len(axioms)}")
-        
-        for sentence in axioms:
-            self.kb.tell(sentence)
-        if self.keep_axioms:
-            self.kb.axioms += axioms
+        return axioms
+
+    def add_temporal_axioms(self):
+        if self.verbose:
+            print("       HWA.add_temporal_axioms()")
+        if self.verbose or self.keep_axioms:
+            # the readable axioms are only needed for the counts and kb.axioms;
+            # the KB itself is told the precompiled clauses below
+            axioms = self._temporal_axiom_sentences()
+            if self.keep_axioms:
+                self.kb.axioms += axioms
+
+        bounds = (1, self.width, 1, self.height)
+        families = [(wumpus_kb.generate_square_OK_axioms, bounds),
+                    (wumpus_kb.generate_breeze_percept_and_location_axioms, bounds),
+                    (wumpus_kb.generate_stench_percept_and_location_axioms, bounds),
+                    (wumpus_kb.generate_at_location_ssa,
+                     (self.belief_location[0], self.belief_location[1]) + bounds
+                     + (self.heading_str(self.belief_heading),)),
+                    (wumpus_kb.generate_non_location_ssa, ()),
+                    (wumpus_kb.generate_mutually_exclusive_axioms, ())]
+        self.kb.tell_clauses(chain.from_iterable(
+            temporal_axiom_clauses(generator, self.time, *args) for generator, args in families))
 
     def wumpus_alive_query(self):
         if self.verbose:
             print("       Ask if Wumpus is Alive:")
-        query = logic.expr(wumpus_kb.state_wumpus_alive_str(self.time))
+        query = _expr(wumpus_kb.state_wumpus_alive_str(self.time))
         result = self.kb.ask(query)
         if self.verbose:
             if result is None:
@@ -198,30 +458,39 @@ class HybridWumpusAgent(wumpus_environment.Explorer):
             else:
                 print(f"         Is Wumpus Alive? : {result}")
 
+    def _scan_OK(self):
+        """ Ask whether each location is OK now; the one scan serves both
+        find_OK_locations and find_not_unsafe_locations until the time or
+        the KB changes. Returns (safe, not_unsafe, answers): the locations
+        known to be OK, those not known to be unsafe, and each location's
+        (query, result) """
+        key = (self.time, self.kb, self.kb.version)
+        if self._ok_scan is None or self._ok_scan[0] != key:
+            t, get_ok_expr = self.time, self._get_ok_expr
+            queries = {(x, y): get_ok_expr(x, y, t) for (x, y) in self._cells}
+            results = self.kb.ask_many(queries.values())
+            answers = {loc: (query, results[query]) for loc, query in queries.items()}
+            safe = frozenset(loc for loc, (_, result) in answers.items() if result)
+            not_unsafe = frozenset(loc for loc, (_, result) in answers.items()
+                                   if result is not False)
+            self._ok_scan = (key, (safe, not_unsafe, answers))
+        return self._ok_scan[1]
+
     def find_OK_locations(self):
-        display_env = None
         start_time = None
         if self.verbose:
             print("     HWA.find_OK_locations()")
             
             self.wumpus_alive_query()
             
-            display_env = wumpus_environment.WumpusEnvironment(self.width, self.height)
             start_time = perf_counter()  # clock()
-        safe_loc = []
-        for x in range(1, self.width + 1):
-            for y in range(1, self.height + 1):
-                query = logic.expr(wumpus_kb.state_OK_str(x, y, self.time))
-                result = self.kb.ask(query)
-                if result:
-                    safe_loc.append((x, y))
-                if self.verbose:
-                    if result is None:
-                        display_env.add_thing(Proposition(query, '?'), (x, y))
-                    else:
-                        display_env.add_thing(Proposition(query, result), (x, y))
+        safe_loc, _, answers = self._scan_OK()
         if self.verbose:
             end_time = perf_counter()  # clock()
+            # the display is built after the timed queries
+            display_env = wumpus_environment.WumpusEnvironment(self.width, self.height)
+            for loc, (query, result) in answers.items():
+                display_env.add_thing(Proposition(query, '?' if result is None else result), loc)
             print("          >>> time elapsed while making OK location queries:"
                   f" {end_time - start_time}")
             print(display_env.to_string(self.time, title="Find OK locations queries"))
@@ -241,25 +510,20 @@ class HybridWumpusAgent(wumpus_environment.Explorer):
         if self.verbose:
             print("     HWA.update_unvisited_locations()")
             display_env = wumpus_environment.WumpusEnvironment(self.width, self.height)
-            already_visited = [(x, y)
-                               for x in range(1, self.width + 1)
-                               for y in range(1, self.height + 1)
-                               if (x, y) not in self.unvisited]
+            already_visited = [loc for loc in self._cells if loc not in self.unvisited]
             for x, y in already_visited:
-                display_env.add_thing(Proposition(logic.expr('~Vis'), 'T'), (x, y))
+                display_env.add_thing(Proposition(_expr('~Vis'), 'T'), (x, y))
             start_time = perf_counter()  # clock()
-        for (x, y) in self.unvisited:
-            query = logic.expr(wumpus_kb.state_loc_str(x, y, self.time))
-            vis_query_result = self.kb.ask(query)
-            if vis_query_result:
-                self.unvisited.remove((x, y))
+        t, get_loc_expr = self.time, self._get_loc_expr
+        queries = {(x, y): get_loc_expr(x, y, t) for (x, y) in self.unvisited}
+        results = self.kb.ask_many(queries.values())
+        self.unvisited -= {loc for loc, query in queries.items() if results[query]}
         if self.verbose:
             end_time = perf_counter()  # clock()
             print("          >>> time elapsed while making unvisited locations queries:"
                   + f" {end_time - start_time}")
             for vis_loc in self.unvisited:
-                # TODO: x and y here are only defined by previous for loop, something's missing...
-                display_env.add_thing(Proposition(logic.expr('~Vis'), 'F'), (x, y))
+                display_env.add_thing(Proposition(_expr('~Vis'), 'F'), vis_loc)
         return self.unvisited
 
     def display_locations_utility(self, locations,
@@ -267,64 +531,49 @@ class HybridWumpusAgent(wumpus_environment.Explorer):
                                   prop=wumpus_kb.state_loc_str,
                                   title="Safe univisited locations:"):
         display_env = wumpus_environment.WumpusEnvironment(self.width, self.height)
-        for x,y in locations:
+        for x,y in sorted(locations):
             if isinstance(prop, str):
                 loc_prop = prop + f'{(x, y, self.time)}'
             else:
                 # assumes prop is bound to the state_loc_str *function*
-                loc_prop = logic.expr(prop(x, y, self.time))
+                loc_prop = _expr(prop(x, y, self.time))
             display_env.add_thing(Proposition(loc_prop, 'T'), (x, y))
         print(display_env.to_string(self.time, title=title))
 
     def find_possible_wumpus_locations(self):
-        display_env = None
         start_time = None
         if self.verbose:
             print("     HWA.find_possible_wumpus_locations()")
-            display_env = wumpus_environment.WumpusEnvironment(self.width, self.height)
             start_time = perf_counter()  # clock()
-        possible_wumpus_loc = list()
-        for x in range(1, self.width + 1):
-            for y in range(1, self.height + 1):
-                query = logic.expr(wumpus_kb.wumpus_str(x, y))
-                result = self.kb.ask(query)
-                if result is not False:
-                    possible_wumpus_loc.append((x, y))
-                if self.verbose:
-                    if result is None:
-                        display_env.add_thing(Proposition(query, '?'), (x, y))
-                    else:
-                        display_env.add_thing(Proposition(query, result), (x, y))
+        get_wumpus_expr = self._get_wumpus_expr
+        queries = {(x, y): get_wumpus_expr(x, y) for (x, y) in self._cells}
+        results = self.kb.ask_many(queries.values())
+        possible_wumpus_loc = frozenset(loc for loc, query in queries.items()
+                                        if results[query] is not False)
         if self.verbose:
             end_time = perf_counter()  # clock()
+            display_env = wumpus_environment.WumpusEnvironment(self.width, self.height)
+            for loc, query in queries.items():
+                result = results[query]
+                display_env.add_thing(Proposition(query, '?' if result is None else result), loc)
             print("          >>> time elapsed while making possible wumpus location queries:"
                   + f" {end_time - start_time}")
             print(display_env.to_string(self.time, title="Possible Wumpus Location queries"))
-            print(f"Possible locations: {possible_wumpus_loc}")
+            print(f"Possible locations: {sorted(possible_wumpus_loc)}")
         return possible_wumpus_loc
 
     def find_not_unsafe_locations(self):
-        display_env = None
         start_time = None
         if self.verbose:
             print("   HWA.find_not_unsafe_locations()")
-            display_env = wumpus_environment.WumpusEnvironment(self.width, self.height)
             start_time = perf_counter()  # clock()
-        not_unsafe = []
-        for x in range(1,self.width+1):
-            for y in range(1,self.height+1):
-                query = logic.expr(wumpus_kb.state_OK_str(x, y, self.time))
-                result = self.kb.ask(query)
-                if result is not False:
-                    not_unsafe.append((x, y))
-                if self.verbose:
-                    if result is not False:
-                        if result is None:
-                            display_env.add_thing(Proposition(query, '?'), (x, y))
-                        else:
-                            display_env.add_thing(Proposition(query, 'T'), (x, y))
+        _, not_unsafe, answers = self._scan_OK()
         if self.verbose:
             end_time = perf_counter()  # clock()
+            display_env = wumpus_environment.WumpusEnvironment(self.width, self.height)
+            for loc, (query, result) in answers.items():
+                if result is not False:
+                    display_env.add_thing(Proposition(query, '?' if result is None else 'T'), loc)
             print("          >>> time elapsed while making not unsafe location queries:"
                   + f" {end_time - start_time}")
             print(display_env.to_string(self.time, title="Not Unsafe Location queries"))
@@ -335,13 +584,19 @@ class HybridWumpusAgent(wumpus_environment.Explorer):
         start_time = None
         if self.verbose:
             start_time = perf_counter()  # clock()
+        previous = self.belief_location
         self.belief_location = None
-        for x in range(1, self.width + 1):
-            for y in range(1, self.height+1):
-                query = logic.expr(wumpus_kb.state_loc_str(x, y, self.time))
-                result = self.kb.ask(query)
-                if result:
-                    self.belief_location = wumpus_kb.loc_proposition_to_tuple(f'{query}')
+        t, get_loc_expr, ask = self.time, self._get_loc_expr, self.kb.ask
+        cells = self._cells
+        if previous:
+            # the agent can only have moved one step, so look nearby first
+            cells = sorted(cells, key=lambda loc: abs(loc[0] - previous[0]) + abs(loc[1] - previous[1]))
+        # the agent is in exactly one location, so stop at the first found
+        for (x, y) in cells:
+            query = get_loc_expr(x, y, t)
+            if ask(query):
+                self.belief_location = wumpus_kb.loc_proposition_to_tuple(f'{query}')
+                break
         if not self.belief_location:
             if self.verbose:
                 print("        --> FAILED TO INFER belief location, "
@@ -358,15 +613,16 @@ class HybridWumpusAgent(wumpus_environment.Explorer):
         start_time = None
         self.belief_heading = None
         if self.verbose: start_time = perf_counter()  # clock()
-        if self.kb.ask(logic.expr(wumpus_kb.state_heading_north_str(self.time))):
-            self.belief_heading = wumpus_environment.Explorer.heading_str_to_num['north']
-        elif self.kb.ask(logic.expr(wumpus_kb.state_heading_west_str(self.time))):
-            self.belief_heading = wumpus_environment.Explorer.heading_str_to_num['west']
-        elif self.kb.ask(logic.expr(wumpus_kb.state_heading_south_str(self.time))):
-            self.belief_heading = wumpus_environment.Explorer.heading_str_to_num['south']
-        elif self.kb.ask(logic.expr(wumpus_kb.state_heading_east_str(self.time))):
-            self.belief_heading = wumpus_environment.Explorer.heading_str_to_num['east']
-
+        # the headings are mutually exclusive: ask all four in one batch
+        queries = {_expr(wumpus_kb.state_heading_north_str(self.time)): 'north',
+                   _expr(wumpus_kb.state_heading_west_str(self.time)): 'west',
+                   _expr(wumpus_kb.state_heading_south_str(self.time)): 'south',
+                   _expr(wumpus_kb.state_heading_east_str(self.time)): 'east'}
+        results = self.kb.ask_many(queries)
+        for query, heading in queries.items():
+            if results[query]:
+                self.belief_heading = wumpus_environment.Explorer.heading_str_to_num[heading]
+                break
         else:
             print("        --> FAILED TO INFER belief heading, assuming initial heading.")
             self.belief_heading = self.initial_heading
@@ -382,9 +638,12 @@ class HybridWumpusAgent(wumpus_environment.Explorer):
         clauses_before = None
         start_time = None
         unvisited = None
+        # bound once: agent_program runs on every step
+        verbose, kb, t = self.verbose, self.kb, self.time
+        plan_route = wumpus_planners.plan_route
 
-        if self.verbose:
-            print(f"HWA.agent_program(): at time {self.time}")
+        if verbose:
+            print(f"HWA.agent_program(): at time {t}")
 
         # update belief location and heading based on current KB knowledge state
         # if self.verbose: print "     HWA.infer_and_set_belief_location()"
@@ -393,140 +652,139 @@ class HybridWumpusAgent(wumpus_environment.Explorer):
         # self.infer_and_set_belief_heading()
 
         percept_sentence = self.make_percept_sentence(percept)
-        if self.verbose:
+        if verbose:
             print("     HWA.agent_program(): kb.tell(percept_sentence):")
             print(f"         {percept_sentence}")
-        self.kb.tell(percept_sentence) # update the agent's KB based on percepts
+        kb.tell(percept_sentence) # update the agent's KB based on percepts
         if self.keep_axioms:
-            self.kb.axioms.append(percept_sentence)
+            kb.axioms.append(percept_sentence)
 
         # NOTE (CTM:20170412): updating location *has* to happen *after* percepts
         # have been added to the KB.  Otherwise, after bump or scream
         # update belief location and heading based on current KB knowledge state
-        if self.verbose:
+        if verbose:
             print("     HWA.infer_and_set_belief_location()")
         self.infer_and_set_belief_location()
-        if self.verbose:
+        if verbose:
             print("     HWA.infer_and_set_belief_heading()")
         self.infer_and_set_belief_heading()
+        location, heading = self.belief_location, self.belief_heading
 
-        if self.verbose:
-            clauses_before = len(self.kb.clauses)
+        if verbose:
+            clauses_before = len(kb.clauses)
             print("     HWA.agent_program(): Prepare to add temporal axioms")
             print(f"         Number of clauses in KB before: {clauses_before}")
         self.add_temporal_axioms()
-        if self.verbose:
-            clauses_after = len(self.kb.clauses)
+        if verbose:
+            clauses_after = len(kb.clauses)
             print(f"         Number of clauses in KB after: {clauses_after}")
             print(f"         Total clauses added to KB: {clauses_after - clauses_before}")
-            self.number_of_clauses_over_epochs.append(len(self.kb.clauses))
+            self.number_of_clauses_over_epochs.append(len(kb.clauses))
 
         safe = None
+        plan = self.plan
 
         # If Glitter, Grab gold and leave
-        if self.kb.ask(wumpus_kb.percept_glitter_str(self.time)):
-            if self.verbose:
+        if kb.ask(wumpus_kb.percept_glitter_str(t)):
+            if verbose:
                 print("   HWA.agent_program(): Grab gold and leave!")
             safe = self.find_OK_locations()
-            if self.verbose: start_time = perf_counter()  # clock()
-            self.plan = [wumpus_kb.action_grab_str(None)] \
-                        + wumpus_planners.plan_route(self.belief_location, self.belief_heading,
-                                     [self.initial_location], safe) \
-                        + [wumpus_kb.action_climb_str(None)]
-            if self.verbose:
+            if verbose: start_time = perf_counter()  # clock()
+            plan = [wumpus_kb.action_grab_str(None)] \
+                   + plan_route(location, heading, [self.initial_location], safe) \
+                   + [wumpus_kb.action_climb_str(None)]
+            if verbose:
                 end_time = perf_counter()  # clock()
                 print("          >>> time elapsed while executing plan_route():"
                       + f" {end_time - start_time}")
 
         # Update safe locations only if we don't have a plan
-        if self.plan:
-            if self.verbose:
+        if plan:
+            if verbose:
                 print("   HWA.agent_program(): Already have plan"
-                      + f" (with {len(self.plan)} actions left), continue executing...")
+                      + f" (with {len(plan)} actions left), continue executing...")
         elif safe is None:
-            if self.verbose:
+            if verbose:
                 print("   HWA.agent_program(): No current plan, find one...")
             safe = self.find_OK_locations()
 
         # Visit unvisited safe square
-        if not self.plan:
-            if self.verbose:
+        if not plan:
+            if verbose:
                 print("   HWA.agent_program(): Plan to visit safe square...")
             unvisited = self.update_unvisited_locations()  # find_unvisited_locations()
-            safe_unvisited = list(set(unvisited).intersection(set(safe)))
-            if self.verbose:
+            safe_unvisited = unvisited & safe
+            if verbose:
                 self.display_locations_utility(safe_unvisited, prop=wumpus_kb.state_loc_str,
                                                title="Safe univisited locations:")
                 start_time = perf_counter()  # clock()
-            self.plan = wumpus_planners.plan_route(self.belief_location, self.belief_heading, safe_unvisited, safe)
-            if self.verbose:
+            plan = plan_route(location, heading, safe_unvisited, safe)
+            if verbose:
                 end_time = perf_counter()  # clock()
                 print("          >>> time elapsed while executing plan_route():"
                       + f" {end_time-start_time}")
         # Shoot wumpus to try to clear path
-        if not self.plan and self.kb.ask(logic.expr(wumpus_kb.state_have_arrow_str(self.time))):
-            if self.verbose:
+        if not plan and kb.ask(_expr(wumpus_kb.state_have_arrow_str(t))):
+            if verbose:
                 print("   HWA.agent_program(): Plan to shoot wumpus...")
             possible_wumpus = self.find_possible_wumpus_locations()
-            if self.verbose: start_time = perf_counter()  # clock()
-            self.plan = wumpus_planners.plan_shot(self.belief_location, self.belief_heading, possible_wumpus, safe)
-            if self.verbose:
+            if verbose: start_time = perf_counter()  # clock()
+            plan = wumpus_planners.plan_shot(location, heading, possible_wumpus, safe)
+            if verbose:
                 end_time = perf_counter()  # clock()
                 print("          >>> time elapsed while executing plan_shot():"
                       + f" {end_time-start_time}")
         # No safe choice, take risk with an unknown square
-        if not self.plan:
-            if self.verbose:
+        if not plan:
+            if verbose:
                 print("   HWA.agent_program(): No safe choice, take risk...")
             not_unsafe = self.find_not_unsafe_locations()
 
             # print "univisited: ", unvisited
             
-            not_unsafe_unvisited = list(set(unvisited).intersection(set(not_unsafe)))
+            not_unsafe_unvisited = unvisited & not_unsafe
 
             # print "not_unsafe_unvisited", not_unsafe_unvisited
             # print "safe", safe
 
-            safe_and_not_unsafe_unvisited = list(set(safe).union(set(not_unsafe_unvisited)))
+            safe_and_not_unsafe_unvisited = safe | not_unsafe_unvisited
 
             # print "safe_and_not_unsafe_unvisited", safe_and_not_unsafe_unvisited
             
-            if self.verbose: start_time = perf_counter()  # clock()
-            self.plan = wumpus_planners.plan_route(self.belief_location,
-                                                   self.belief_heading,
-                                                   not_unsafe_unvisited,
-                                                   safe_and_not_unsafe_unvisited)
-            if self.verbose:
+            if verbose: start_time = perf_counter()  # clock()
+            plan = plan_route(location, heading,
+                              not_unsafe_unvisited,
+                              safe_and_not_unsafe_unvisited)
+            if verbose:
                 end_time = perf_counter()  # clock()
                 print("          >>> time elapsed while executing plan_route():"
                       + f" {end_time - start_time}")
         # No choices left, leave!
-        if not self.plan:
-            if self.verbose:
+        if not plan:
+            if verbose:
                 print("   HWA.agent_program(): No choices left, leave!...")
                 start_time = perf_counter()  # clock()
-            self.plan = wumpus_planners.plan_route(self.belief_location,
-                                                   self.belief_heading,
-                                                   self.initial_location, safe) \
-                        + [wumpus_kb.action_climb_str(None)]
-            if self.verbose:
+            plan = plan_route(location, heading, [self.initial_location], safe) \
+                   + [wumpus_kb.action_climb_str(None)]
+            if verbose:
                 end_time = perf_counter()  # clock()
                 print("          >>> time elapsed while executing plan_route():"
                       + f" {end_time - start_time}")
 
-        if self.verbose:
-            print(f"   HWA.agent_program(): Plan:\n    {self.plan}")
+        if verbose:
+            print(f"   HWA.agent_program(): Plan:\n    {plan}")
 
-        action = self.plan.pop(0)  # take next action in plan
+        action = plan.pop(0)  # take next action in plan
 
-        if self.verbose:
+        if verbose:
             print(f"   HWA.agent_program(): Action: {action}")
 
         # update KB with selected action
-        self.kb.tell(wumpus_kb.add_time_stamp(action, self.time))
+        action_sentence = wumpus_kb.add_time_stamp(action, t)
+        kb.tell(action_sentence)
         if self.keep_axioms:
-            self.kb.axioms.append(wumpus_kb.add_time_stamp(action, self.time))
+            kb.axioms.append(action_sentence)
         
-        self.time += 1  # advance the agent's time
+        self.plan = plan
+        self.time = t + 1  # advance the agent's time
         return action
-
@@ -0,0 +1,156 @@
+import random
+import re
+
+import logic
+import wumpus_agent
+
+
+# -----------------------------------------------------------------------------
+# PropKB_SAT Tests
+# -----------------------------------------------------------------------------
+
+def tt_answer(sentences, query):
+    """
+    What PropKB_SAT.ask should answer for query after telling sentences,
+    by truth tables: True or False if the KB entails query or ~query (but
+    not both), otherwise None.
+    """
+    kb = logic.Expr('&', *sentences) if sentences else logic.expr('A | ~A')
+    entails, refutes = logic.tt_entails(kb, query), logic.tt_entails(kb, ~query)
+    return None if entails == refutes else entails
+
+
+def test_ask_many_random():
+    """
+    ask_many on random KBs of short clauses, told one at a time or in
+    bulk, and now and then retracted, answers as tt_answer does; the same
+    queries are asked again after each change, so cached answers are
+    checked too.
+    """
+    rnd = random.Random(0)
+    symbols = [logic.Expr(name) for name in 'ABCDEFG']
+    for _ in range(60):
+        kb, told = wumpus_agent.PropKB_SAT(), []
+        for _ in range(10):
+            clauses = [logic.associate('|', [s if rnd.random() < 0.5 else ~s
+                                             for s in rnd.sample(symbols, rnd.randint(1, 2))])
+                       for _ in range(rnd.randint(1, 2))]
+            if told and rnd.random() < 0.15:
+                sentence = rnd.choice(told)
+                kb.retract(sentence)
+                told.remove(sentence)
+            elif len(clauses) > 1:
+                kb.tell_many(clauses)
+                told.extend(clauses)
+            else:
+                kb.tell(clauses[0])
+                told.append(clauses[0])
+            queries = rnd.sample(symbols, 3)
+            answers = kb.ask_many(queries)
+            for query in queries:
+                assert answers[query] == tt_answer(told, query), (told, query, answers)
+
+
+def test_ask_after_inconsistent_tell():
+    """
+    A query answered while the KB was consistent is unknown (None) once
+    later tells make the KB inconsistent.
+    """
+    kb = wumpus_agent.PropKB_SAT()
+    kb.tell(logic.expr('~E'))
+    assert kb.ask(logic.expr('E')) is False
+    kb.tell(logic.expr('~G'))
+    kb.tell(logic.expr('G'))
+    assert kb.ask(logic.expr('E')) is None
+
+
+PROPKB_SAT_TESTS = (test_ask_many_random, test_ask_after_inconsistent_tell)
+
+
+def run_propkb_sat_tests():
+    print('\n--------------------------\nRunning PropKB_SAT Tests:')
+    for test in PROPKB_SAT_TESTS:
+        test()
+        print(f'{test.__name__}: ok')
+
+
+# -----------------------------------------------------------------------------
+# CNF Template Tests
+# -----------------------------------------------------------------------------
+
+def example_axioms(t, width):
+    """
+    Axioms shaped like the temporal axiom families, over symbols stamped
+    with times t and t+1 for cells 1..width: a successor-state axiom for
+    each cell, and a sentence whose CNF blows up, so that it is
+    Tseitin-encoded.
+    """
+    axioms = [f'L{x}_{t + 1} <=> (L{x}_{t} & ~Forward{t}) | (L{x - 1}_{t} & Forward{t})'
+              for x in range(1, width + 1)]
+    axioms.append(' | '.join(f'(L{x}_{t} & HeadingEast{t})' for x in range(1, width + 1)))
+    return axioms
+
+
+def direct_cnf(sentences):
+    """ The clauses of sentences converted one by one, as PropKB.tell does """
+    clauses = []
+    for sentence in filter(None, sentences):
+        if logic.prefer_tseitin(sentence):
+            clauses.extend(logic.tseitin_cnf(sentence))
+        else:
+            clauses.extend(logic.conjuncts(logic.to_cnf(sentence)))
+    return clauses
+
+
+def canonical(clauses):
+    """
+    The clauses as strings, with the symbols naming Tseitin subformulas
+    renamed T0, T1, ... in order of first appearance
+    """
+    names = dict()
+
+    def rename(match):
+        return names.setdefault(match.group(), f'T{len(names)}')
+
+    return [re.sub(r'\b(?:TemplateAux|Aux|Tseitin)\d+\b', rename, str(clause))
+            for clause in clauses]
+
+
+def test_templates_match_direct_cnf():
+    """
+    The clauses instantiated from the CNF template of example_axioms at
+    several times are those of converting example_axioms at that time
+    directly, up to the names of the Tseitin symbols.
+    """
+    assert any(logic.prefer_tseitin(sentence) for sentence in example_axioms(0, 7))
+    for t in (0, 1, 5, 12, 40):
+        clauses = wumpus_agent.temporal_axiom_clauses(example_axioms, t, 7)
+        assert canonical(clauses) == canonical(direct_cnf(example_axioms(t, 7))), t
+
+
+def test_template_tseitin_symbols_are_fresh():
+    """
+    Each instance of a template names its Tseitin subformulas with
+    symbols of its own, so instances told to one KB stay independent.
+    """
+    def aux_symbols(clauses):
+        return {s for s in logic.prop_symbols(logic.Expr('&', *clauses)) if s.op.startswith('Aux')}
+
+    first = aux_symbols(wumpus_agent.temporal_axiom_clauses(example_axioms, 3, 7))
+    second = aux_symbols(wumpus_agent.temporal_axiom_clauses(example_axioms, 3, 7))
+    assert first and second and not first & second
+
+
+CNF_TEMPLATE_TESTS = (test_templates_match_direct_cnf, test_template_tseitin_symbols_are_fresh)
+
+
+def run_cnf_template_tests():
+    print('\n--------------------------\nRunning CNF Template Tests:')
+    for test in CNF_TEMPLATE_TESTS:
+        test()
+        print(f'{test.__name__}: ok')
+
+
+if __name__ == '__main__':
+    run_propkb_sat_tests()
+    run_cnf_template_tests()
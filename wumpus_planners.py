@@ -1,54 +1,338 @@
+import logging
+from array import array
+from collections import defaultdict
+from functools import lru_cache
+from itertools import chain
+
 import wumpus_environment
 import wumpus_kb
 import search
 
+try:  # optional: numba compiles the route search for large grids
+    import numpy
+    from numba import njit
+except ImportError:
+    numpy = njit = None
+
+logger = logging.getLogger(__name__)
+
 
 # -----------------------------------------------------------------------------
 # Distance fn
 # -----------------------------------------------------------------------------
 
+# Per heading (0:north 1:west 2:south 3:east): the sign that makes
+# "target behind" positive along the axis of travel
+_SIGN = (1, -1, -1, 1)
+
+
+def _mdh(cx, cy, ch, tx, ty):
+    """ manhattan_distance_with_heading on plain ints: from (cx,cy) heading
+    ch to target (tx,ty) """
+    md = abs(cx - tx) + abs(cy - ty)
+    if ch == 0 or ch == 2:
+        side, ahead = (cy - ty) * _SIGN[ch], cx == tx
+    else:
+        side, ahead = (cx - tx) * _SIGN[ch], cy == ty
+    if side > 0:
+        return md + 2     # target is behind: need two turns to turn around
+    # target is ahead; one turn unless it is straight ahead
+    return md if ahead else md + 1
+
+
+@lru_cache(maxsize=4096)
 def manhattan_distance_with_heading(current, target):
     """
     Return the Manhattan distance + any turn moves needed
         to put target ahead of current heading
     current: (x,y,h) tuple, so: [0]=x, [1]=y, [2]=h=heading)
     heading: 0:^:north 1:<:west 2:v:south 3:>:east
+    Memoized, for a heuristic that A* evaluates for the same (state, goal)
+    pairs over and over; the cache keeps the most recent 4096 pairs.
     """
-    md = abs(current[0] - target[0]) + abs(current[1] - target[1])
-    if current[2] == 0:   # heading north
-        # Since the agent is facing north, "side" here means
-        # whether the target is in a row above or below (or
-        # the same) as the agent.
-        # (Same idea is used if agent is heading south)
-        side = (current[1] - target[1])
-        if side > 0:
-            md += 2           # target is behind: need to turns to turn around
-        elif side <= 0 and current[0] != target[0]:
-            md += 1           # target is ahead but not directly: just need to turn once
-        # note: if target straight ahead (curr.x == tar.x), no turning required
-    elif current[2] == 1:  # heading west
-        # Now the agent is heading west, so "side" means
-        # whether the target is in a column to the left or right
-        # (or the same) as the agent.
-        # (Same idea is used if agent is heading east)
-        side = (current[0] - target[0])
-        if side < 0:
-            md += 2           # target is behind
-        elif side >= 0 and current[1] != target[1]:
-            md += 1           # target is ahead but not directly
-    elif current[2] == 2:  # heading south
-        side = (current[1] - target[1])
-        if side < 0:
-            md += 2           # target is behind
-        elif side >= 0 and current[0] != target[0]:
-            md += 1           # target is ahead but not directly
-    elif current[2] == 3:  # heading east
-        side = (current[0] - target[0])
-        if side > 0:
-            md += 2           # target is behind
-        elif side <= 0 and current[1] != target[1]:
-            md += 1           # target is ahead but not directly
-    return md
+    return _mdh(current[0], current[1], current[2], target[0], target[1])
+
+
+def _goal_distance(goals):
+    """ Function of (x, y, h) giving manhattan_distance_with_heading to the
+    nearest of <goals>, with one or two goals (the usual case) bound in
+    directly rather than looped over """
+    goals = tuple(goals)
+    if len(goals) == 1:
+        (gx, gy), = goals
+        return lambda x, y, h: _mdh(x, y, h, gx, gy)
+    if len(goals) == 2:
+        (ax, ay), (bx, by) = goals
+        return lambda x, y, h: min(_mdh(x, y, h, ax, ay), _mdh(x, y, h, bx, by))
+    return lambda x, y, h: min(_mdh(x, y, h, gx, gy) for gx, gy in goals)
+
+
+# -----------------------------------------------------------------------------
+# Search states
+# -----------------------------------------------------------------------------
+
+# The planning problems keep each (x, y, heading) state packed into one int:
+# ints hash to themselves and compare in one step, and packed states order
+# the same way as the tuples do. The heading takes the low 2 bits and y the
+# 32 above them; x takes the rest, so it is not bounded.
+
+def _pack(x, y, h):
+    return (x << 34) | (y << 2) | h
+
+
+def _unpack(state):
+    return state >> 34, (state >> 2) & 0xFFFFFFFF, state & 3
+
+
+# Per heading, the (dx, dy) of a Forward move
+_DX = (0, -1, 0, 1)
+_DY = (1, 0, -1, 0)
+
+# The searches work with action ids, and keep plans as array('b') of them;
+# only plans handed back to callers carry the action names
+_FORWARD, _TURN_LEFT, _TURN_RIGHT = 0, 1, 2
+_ACTION_NAMES = (wumpus_kb.action_forward_str(),
+                 wumpus_kb.action_turn_left_str(),
+                 wumpus_kb.action_turn_right_str())
+_ACTION_IDS = {name: a for a, name in enumerate(_ACTION_NAMES)}
+
+# Per action id: the heading after the move, indexed by the heading before
+# it, and whether the move steps along the heading
+_NEXT_HEADING = ((0, 1, 2, 3), (1, 2, 3, 0), (3, 0, 1, 2))
+_STEPS = (1, 0, 0)
+
+
+def _cell_bits(cells):
+    """ (bits, width) for a set of (x,y) cells, x and y >= 0: bit
+    y*width + x of the int bits is set for each cell """
+    width = max(x for x, _ in cells) + 1 if cells else 1
+    bits = 0
+    for x, y in cells:
+        bits |= 1 << (y * width + x)
+    return bits, width
+
+
+def _result(x, y, h, action):
+    """ Packed state after action id <action> from (x,y) heading h """
+    step = _STEPS[action]
+    return _pack(x + _DX[h] * step, y + _DY[h] * step, _NEXT_HEADING[action][h])
+
+
+def _successors(x, y, h, bits, width):
+    """ [(action id, packed state)] for the moves from (x,y) heading h;
+    Forward only when it stays within the allowed cells <bits>, <width>
+    (see _cell_bits) """
+    nx, ny = x + _DX[h], y + _DY[h]
+    succ = []
+    if 0 <= nx < width and ny >= 0 and (bits >> (ny * width + nx)) & 1:
+        succ.append((_FORWARD, _pack(nx, ny, h)))
+    succ.append((_TURN_LEFT, _pack(x, y, _NEXT_HEADING[_TURN_LEFT][h])))
+    succ.append((_TURN_RIGHT, _pack(x, y, _NEXT_HEADING[_TURN_RIGHT][h])))
+    return succ
+
+
+def _predecessors(x, y, h, bits, width):
+    """ [(action id, packed state)] for the moves that lead into (x,y)
+    heading h; the reverse of _successors """
+    pred = []
+    if 0 <= x < width and y >= 0 and (bits >> (y * width + x)) & 1:
+        pred.append((_FORWARD, _pack(x - _DX[h], y - _DY[h], h)))
+    pred.append((_TURN_LEFT, _pack(x, y, _NEXT_HEADING[_TURN_RIGHT][h])))
+    pred.append((_TURN_RIGHT, _pack(x, y, _NEXT_HEADING[_TURN_LEFT][h])))
+    return pred
+
+
+def _bidirectional_bfs(start, goal_states, bits, width):
+    """ Shortest array('b') of action ids from packed state <start> to any
+    of the packed <goal_states>, moving only into the allowed cells <bits>,
+    <width> (see _cell_bits); None if there is none.
+    Breadth-first layers are grown alternately from the start and from the
+    goal states (whichever frontier is smaller) until they meet. All moves
+    cost 1, and no route shorter than the depths searched so far can have
+    been missed, so the first state reached from both ends lies on a
+    shortest route and the search stops there. """
+    if start in goal_states:
+        return array('b')
+    fwd = {start: None}                  # state: (parent, action)
+    bwd = dict.fromkeys(goal_states)     # state: (child, action)
+    fwd_frontier, bwd_frontier = [start], list(goal_states)
+    while fwd_frontier and bwd_frontier:
+        forward = len(fwd_frontier) <= len(bwd_frontier)
+        if forward:
+            frontier, seen, other, expand = fwd_frontier, fwd, bwd, _successors
+        else:
+            frontier, seen, other, expand = bwd_frontier, bwd, fwd, _predecessors
+        layer = []
+        for state in frontier:
+            for action, nxt in expand(*_unpack(state), bits, width):
+                if nxt not in seen:
+                    seen[nxt] = (state, action)
+                    if nxt in other:
+                        return _join_plan(fwd, bwd, nxt)
+                    layer.append(nxt)
+        if forward:
+            fwd_frontier = layer
+        else:
+            bwd_frontier = layer
+    return None
+
+
+def _join_plan(fwd, bwd, meet):
+    """ array('b') of the action ids from the start of _bidirectional_bfs's
+    <fwd> links to <meet>, then on along the <bwd> links to a goal """
+    plan = array('b')
+    state = meet
+    while fwd[state] is not None:
+        state, action = fwd[state]
+        plan.append(action)
+    plan.reverse()
+    state = meet
+    while bwd[state] is not None:
+        state, action = bwd[state]
+        plan.append(action)
+    return plan
+
+
+def _bfs_arrays(start, goal, allowed, width):
+    """ _bidirectional_bfs over flat arrays. State (x,y,h) is index
+    (y*width + x)*4 + h; <allowed> flags each cell y*width + x, <goal>
+    each state. Returns (found, array of action ids).
+    Written to compile under numba.njit. """
+    n = goal.shape[0]
+    height = allowed.shape[0] // width
+    fwd_link = numpy.full(n, -1, numpy.int64)    # parent state
+    bwd_link = numpy.full(n, -1, numpy.int64)    # child state
+    fwd_action = numpy.zeros(n, numpy.int64)
+    bwd_action = numpy.zeros(n, numpy.int64)
+    fwd_depth = numpy.full(n, -1, numpy.int64)   # -1: not seen
+    bwd_depth = numpy.full(n, -1, numpy.int64)
+    fwd_frontier = numpy.empty(n, numpy.int64)
+    bwd_frontier = numpy.empty(n, numpy.int64)
+    layer = numpy.empty(n, numpy.int64)
+    if goal[start]:
+        return True, numpy.empty(0, numpy.int64)
+    fwd_depth[start] = 0
+    fwd_frontier[0] = start
+    n_fwd, n_bwd = 1, 0
+    for state in range(n):
+        if goal[state]:
+            bwd_depth[state] = 0
+            bwd_frontier[n_bwd] = state
+            n_bwd += 1
+    while n_fwd > 0 and n_bwd > 0:
+        forward = n_fwd <= n_bwd
+        n_layer, meet = 0, -1
+        for i in range(n_fwd if forward else n_bwd):
+            state = fwd_frontier[i] if forward else bwd_frontier[i]
+            cell, h = state >> 2, state & 3
+            x, y = cell % width, cell // width
+            for action in range(3):
+                if action == _FORWARD:
+                    if forward:
+                        nx, ny = x + _DX[h], y + _DY[h]
+                        if not (0 <= nx < width and 0 <= ny < height and allowed[ny * width + nx]):
+                            continue
+                    else:
+                        nx, ny = x - _DX[h], y - _DY[h]
+                        if not (allowed[cell] and 0 <= nx < width and 0 <= ny < height):
+                            continue
+                    nxt = (ny * width + nx) * 4 + h
+                elif forward:
+                    nxt = cell * 4 + _NEXT_HEADING[action][h]
+                else:  # the turn that undoes this one
+                    nxt = cell * 4 + _NEXT_HEADING[3 - action][h]
+                if forward:
+                    if fwd_depth[nxt] >= 0:
+                        continue
+                    fwd_depth[nxt] = fwd_depth[state] + 1
+                    fwd_link[nxt] = state
+                    fwd_action[nxt] = action
+                else:
+                    if bwd_depth[nxt] >= 0:
+                        continue
+                    bwd_depth[nxt] = bwd_depth[state] + 1
+                    bwd_link[nxt] = state
+                    bwd_action[nxt] = action
+                if fwd_depth[nxt] >= 0 and bwd_depth[nxt] >= 0:
+                    meet = nxt  # reached from both ends: a shortest route
+                    break
+                layer[n_layer] = nxt
+                n_layer += 1
+            if meet >= 0:
+                break
+        if meet >= 0:
+            plan = numpy.empty(fwd_depth[meet] + bwd_depth[meet], numpy.int64)
+            state = meet
+            for i in range(fwd_depth[meet] - 1, -1, -1):
+                plan[i] = fwd_action[state]
+                state = fwd_link[state]
+            state = meet
+            for i in range(fwd_depth[meet], plan.shape[0]):
+                plan[i] = bwd_action[state]
+                state = bwd_link[state]
+            return True, plan
+        if forward:
+            fwd_frontier[:n_layer] = layer[:n_layer]
+            n_fwd = n_layer
+        else:
+            bwd_frontier[:n_layer] = layer[:n_layer]
+            n_bwd = n_layer
+    return False, numpy.empty(0, numpy.int64)
+
+
+if njit is not None:
+    _bfs_arrays = njit(cache=True)(_bfs_arrays)
+
+# The compiled _bfs_arrays is many times faster per search, but loading it
+# (even from numba's on-disk cache) costs some 0.15s, more than the searches
+# on small grids such as the 4x4 worlds can ever give back
+_COMPILED_MIN_CELLS = 400
+
+
+def _search(problem):
+    """ Shortest array('b') of action ids from problem.initial to one of
+    problem.goal_states (a PlanRouteProblem or PlanShotProblem); None if
+    there is none """
+    if njit is None or len(problem.allowed) < _COMPILED_MIN_CELLS:
+        return _bidirectional_bfs(problem.initial, problem.goal_states,
+                                  problem.allowed_bits, problem.width)
+    x0, y0, _ = _unpack(problem.initial)
+    width = max(problem.width, x0 + 1)
+    height = max(max(y for _, y in problem.allowed), y0) + 1
+    allowed = numpy.zeros(width * height, numpy.uint8)
+    for x, y in problem.allowed:
+        allowed[y * width + x] = 1
+    goal = numpy.zeros(width * height * 4, numpy.uint8)
+    for state in problem.goal_states:
+        x, y, h = _unpack(state)
+        if x < width and y < height:  # others are out of reach
+            goal[(y * width + x) * 4 + h] = 1
+    found, plan = _bfs_arrays((y0 * width + x0) * 4 + _unpack(problem.initial)[2],
+                              goal, allowed, width)
+    return array('b', plan.astype(numpy.int8).tobytes()) if found else None
+
+
+# The last problem built by each planner, with the (goals, allowed) it was
+# built for: the agent replans from new locations far more often than its
+# goals or safe locations change
+_problem_cache = {}
+
+
+def _problem(cls, initial, goals, allowed):
+    """ A <cls> (PlanRouteProblem or PlanShotProblem) from <initial> for
+    <goals> and <allowed>, reusing the last one built when only the initial
+    state differs. A problem's goal states and tables take in its initial
+    location only when it is not allowed, so a cached one is reused only
+    when the new initial location is allowed. """
+    key = (frozenset(goals), frozenset(allowed))
+    cached = _problem_cache.get(cls)
+    if cached is not None and cached[0] == key and (initial[0], initial[1]) in key[1]:
+        problem = cached[1]
+        problem.initial = _pack(*initial)
+        return problem
+    problem = cls(initial, key[0], key[1])
+    _problem_cache[cls] = (key, problem)
+    return problem
 
 
 # -----------------------------------------------------------------------------
@@ -65,32 +349,41 @@ def plan_route(current, heading, goals, allowed):
     ... return a list of actions (no time stamps!) that when executed
     will take the agent from the current location to one of (the closest)
     goal locations
-    You will need to:
-    (1) Construct a PlanRouteProblem that extends search.Problem
-    (2) Pass the PlanRouteProblem as the argument to astar_search
-        (search.astar_search(Problem)) to find the action sequence.
-        Astar returns a node.  You can call node.solution() to extract
-        the list of actions.
+    Moves cost the same, so the route is found by a bidirectional
+    breadth-first search over the PlanRouteProblem's states rather than
+    by A* (PlanRouteProblem still works with search.astar_search).
     NOTE: represent a state as a triple: (x, y, heading)
           where heading will be an integer, as follows:
           0='north', 1='west', 2='south', 3='east'
     """
+    plan = _route(current, heading, goals, allowed)
+    if plan is None:
+        # no route can be found, return empty list
+        logger.debug('no route found for %s -> %s', current, goals)
+        return list()
+    return list(map(_ACTION_NAMES.__getitem__, plan))
+
+
+def plan_route_iter(current, heading, goals, allowed):
+    """ plan_route as an iterator over the actions, for callers that step
+    through the plan once; empty if no route can be found """
+    return map(_ACTION_NAMES.__getitem__, _route(current, heading, goals, allowed) or ())
+
+
+def _route(current, heading, goals, allowed):
+    """ The action ids of plan_route, or None if there is no route """
+    if goals and allowed:
+        return _search(_problem(PlanRouteProblem, _start(current, heading), goals, allowed))
+    return None
 
+
+def _start(current, heading):
+    """ The (x, y, heading) start state of a plan, heading given as an
+    int or as a heading string """
     # Ensure heading is a in integer form
     if isinstance(heading, str):
         heading = wumpus_environment.Explorer.heading_str_to_num[heading]
-
-    if goals and allowed:
-        prp = PlanRouteProblem((current[0], current[1], heading), goals, allowed)
-        # NOTE: PlanRouteProblem will include a method h() that computes
-        #       the heuristic, so no need to provide here to astar_search()
-        node = search.astar_search(prp, display=False)
-        if node:
-            return node.solution()
-    
-    # no route can be found, return empty list
-    print('>>> NO ROUTE FOUND')
-    return list()
+    return current[0], current[1], heading
 
 
 # -----------------------------------------------------------------------------
@@ -98,42 +391,53 @@ def plan_route(current, heading, goals, allowed):
 class PlanRouteProblem(search.Problem):
     def __init__(self, initial, goals, allowed):
         """ Problem defining planning of route to closest goal
-        Goal is generally a location (x,y) tuple, but state will be (x,y,heading) tuple
-        initial = initial location, (x,y) tuple
+        Goal is generally a location (x,y) tuple, but state will be (x,y,heading),
+            packed into an int (see _pack)
+        initial = initial (x,y,heading) tuple
         goals   = list of goal (x,y) tuples
         allowed = list of state (x,y) tuples that agent could move to """
-        super().__init__(initial=initial)
-        # self.initial = initial  # initial state
-        self.goals = goals      # list of goals that can be achieved
-        self.allowed = allowed  # the states we can move into
+        super().__init__(initial=_pack(*initial))
+        self.goals = frozenset(goals)      # goals that can be achieved
+        self.allowed = frozenset(allowed)  # the states we can move into
+        self.allowed_bits, self.width = _cell_bits(self.allowed)  # the same, for _successors
+        # every heading at a goal location
+        self.goal_states = frozenset(_pack(x, y, h) for x, y in self.goals for h in range(4))
+        self._h = _goal_distance(self.goals)
+        self._htable = None  # state: h, filled on first use (plan_route never needs it)
+
+    def _heuristic_table(self):
+        """ h for every state the agent can be in: each heading at each
+        allowed location and at the initial location """
+        x0, y0, _ = _unpack(self.initial)
+        h_of = self._h
+        return {_pack(x, y, h): h_of(x, y, h)
+                for x, y in self.allowed | {(x0, y0)} for h in range(4)}
 
     def h(self, node):
         """
         Heuristic that will be used by search.astar_search()
         """
-        ### YOUR CODE HERE ###
-        return 0  # NOTE: This is wrong!
+        if self._htable is None:
+            self._htable = self._heuristic_table()
+        return self._htable[node.state]
 
     def actions(self, state):
         """
         Return list of allowed actions that can be made in state
         """
-        ### YOUR CODE HERE ###
-        return []  # NOTE: This is wrong!
+        return [_ACTION_NAMES[a] for a, _ in _successors(*_unpack(state), self.allowed_bits, self.width)]
 
     def result(self, state, action):
         """
         Return the new state after applying action to state
         """
-        ### YOUR CODE HERE ###
-        pass
+        return _result(*_unpack(state), _ACTION_IDS[action])
 
     def goal_test(self, state):
         """
         Return True if state is a goal state
         """
-        ### YOUR CODE HERE ###
-        pass
+        return (state >> 34, (state >> 2) & 0xFFFFFFFF) in self.goals
 
 
 # -----------------------------------------------------------------------------
@@ -144,12 +448,17 @@ def plan_shot(current, heading, goals, allowed):
     """ Plan route to nearest location with heading directed toward one of the
     possible wumpus locations (in goals), then append shoot action.
     NOTE: This assumes you can shoot through walls!!  That's ok for now. """
+    return list(plan_shot_iter(current, heading, goals, allowed))
+
+
+def plan_shot_iter(current, heading, goals, allowed):
+    """ plan_shot as an iterator over the actions; empty if no route can
+    be found """
     if goals and allowed:
-        psp = PlanShotProblem((current[0], current[1], heading), goals, allowed)
-        node = search.astar_search(psp)
-        if node:
-            plan = node.solution()
-            plan.append(wumpus_kb.action_shoot_str(None))
+        psp = _problem(PlanShotProblem, _start(current, heading), goals, allowed)
+        # the same search as plan_route, to the states lined up for a shot
+        plan = _search(psp)
+        if plan is not None:
             # HACK:
             # since the wumpus_alive axiom asserts that a wumpus is no longer alive
             # when on the previous round we perceived a scream, we
@@ -158,11 +467,11 @@ def plan_shot(current, heading, goals, allowed):
             # Another approach: with correct successor-state-axiom for WumpusAlive,
             # if there is a scream, then if you look one state into the future you
             # can tell that the Wumpus is dead.
-            plan.append(wumpus_kb.action_wait_str(None))
-            return plan
+            return chain(map(_ACTION_NAMES.__getitem__, plan),
+                         (wumpus_kb.action_shoot_str(None), wumpus_kb.action_wait_str(None)))
 
-    # no route can be found, return empty list
-    return list()
+    # no route can be found, no actions
+    return iter(())
 
 
 # -----------------------------------------------------------------------------
@@ -175,42 +484,59 @@ class PlanShotProblem(search.Problem):
               nearest location with heading in direction of a possible
               wumpus location;
               Shoot and Wait actions is appended to this search solution
-        Goal is generally a location (x,y) tuple, but state will be (x,y,heading) tuple
-        initial = initial location, (x,y) tuple
+        Goal is generally a location (x,y) tuple, but state will be (x,y,heading),
+            packed into an int (see _pack)
+        initial = initial (x,y,heading) tuple
         goals   = list of goal (x,y) tuples
         allowed = list of state (x,y) tuples that agent could move to """
-        super().__init__(initial=initial)
-        # self.initial = initial  # initial state
-        self.goals = goals      # list of goals that can be achieved
-        self.allowed = allowed  # the states we can move into
+        super().__init__(initial=_pack(*initial))
+        self.goals = frozenset(goals)      # goals that can be achieved
+        self.allowed = frozenset(allowed)  # the states we can move into
+        self.allowed_bits, self.width = _cell_bits(self.allowed)  # the same, for _successors
+        # lowest and highest goal y in each column, lowest and highest x in each row
+        cols, rows = defaultdict(list), defaultdict(list)
+        for gx, gy in self.goals:
+            cols[gx].append(gy)
+            rows[gy].append(gx)
+        self._col_span = {x: (min(ys), max(ys)) for x, ys in cols.items()}
+        self._row_span = {y: (min(xs), max(xs)) for y, xs in rows.items()}
+        # every heading, at each location the agent can be at, that is lined up for a shot
+        x0, y0, _ = _unpack(self.initial)
+        states = (_pack(x, y, h) for x, y in self.allowed | {(x0, y0)} for h in range(4))
+        self.goal_states = frozenset(state for state in states if self.goal_test(state))
 
     def h(self, node):
         """
         Heuristic that will be used by search.astar_search()
+        Any state not already lined up for the shot is at least one
+        action (a turn or a step) away from one that is.
         """
-        ### YOUR CODE HERE ###
-        return 0  # NOTE: This is wrong!
+        return 0 if self.goal_test(node.state) else 1
 
     def actions(self, state):
         """
         Return list of allowed actions that can be made in state
         """
-        ### YOUR CODE HERE ###
-        return []  # NOTE: This is wrong!
+        return [_ACTION_NAMES[a] for a, _ in _successors(*_unpack(state), self.allowed_bits, self.width)]
 
     def result(self, state, action):
         """
         Return the new state after applying action to state
         """
-        ### YOUR CODE HERE ###
-        pass
+        return _result(*_unpack(state), _ACTION_IDS[action])
 
     def goal_test(self, state):
         """
-        Return True if state is a goal state
+        Return True if state is a goal state: some goal lies straight
+        ahead along the current heading
         """
-        ### YOUR CODE HERE ###
-        pass
+        x, y, h = _unpack(state)
+        if h == 0 or h == 2:  # north/south: a goal further up/down this column
+            span = self._col_span.get(x)
+            return span is not None and (span[1] > y if h == 0 else span[0] < y)
+        # west/east: a goal further left/right along this row
+        span = self._row_span.get(y)
+        return span is not None and (span[0] < x if h == 1 else span[1] > x)
 
 
 # -----------------------------------------------------------------------------
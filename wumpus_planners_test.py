@@ -1,3 +1,5 @@
+import random
+
 import wumpus_planners
 
 
@@ -121,6 +123,210 @@ def run_psp_tests():
         print(f'plan:     {test_psp(initial, GOALS)}')
 
 
+# -----------------------------------------------------------------------------
+# Large Grid Tests
+# -----------------------------------------------------------------------------
+
+def test_route_past_y_255():
+    """
+    A route up a single column of cells whose y runs past 255, more than
+    fits in a byte: 10 Forward moves north from (0,250) to (0,260).
+    """
+    allowed = [(0, y) for y in range(250, 270)]
+    plan = wumpus_planners.plan_route((0, 250), 0, [(0, 260)], allowed)
+    assert plan == ['Forward'] * 10, plan
+
+
+def test_shot_past_y_255():
+    """
+    A shot along the same column: facing east the agent only needs to
+    turn left to line up with (0,265).
+    """
+    allowed = [(0, y) for y in range(250, 270)]
+    plan = wumpus_planners.plan_shot((0, 258), 3, [(0, 265)], allowed)
+    assert plan == ['TurnLeft', 'Shoot', 'Wait'], plan
+
+
+# A 3x300 grid with a wall across y=150, open only at x=2: large enough
+# (see wumpus_planners._COMPILED_MIN_CELLS) that the planners search it with
+# the numba-compiled search when numba is installed
+TALL_GRID = [(x, y) for x in range(3) for y in range(300) if y != 150 or x == 2]
+
+# Per heading, the (dx, dy) of a Forward move
+FORWARD_STEP = ((0, 1), (-1, 0), (0, -1), (1, 0))
+
+
+def follow(initial, plan, allowed):
+    """
+    The (x, y, heading) reached by carrying out the moves of plan from
+    initial, checking that every Forward move stays within allowed.
+    """
+    x, y, h = initial
+    for action in plan:
+        if action == 'Forward':
+            x, y = x + FORWARD_STEP[h][0], y + FORWARD_STEP[h][1]
+            assert (x, y) in allowed, (initial, plan)
+        elif action == 'TurnLeft':
+            h = (h + 1) % 4
+        elif action == 'TurnRight':
+            h = (h - 1) % 4
+    return x, y, h
+
+
+def test_compiled_route_tall_grid():
+    """
+    From (0,0) facing north to (0,299) on TALL_GRID: 299 moves north, 2
+    over to the gap and 2 back, and 3 turns.
+    """
+    assert len(TALL_GRID) >= wumpus_planners._COMPILED_MIN_CELLS
+    plan = wumpus_planners.plan_route((0, 0), 0, [(0, 299)], TALL_GRID)
+    assert len(plan) == 306 and plan.count('Forward') == 303, plan
+    assert follow((0, 0, 0), plan, TALL_GRID)[:2] == (0, 299)
+
+
+def test_compiled_shot_tall_grid():
+    """
+    From (0,0) facing north to a shot east along row 280 of TALL_GRID, at
+    (5,280): through the gap at x=2, 282 moves and 3 turns.
+    """
+    plan = wumpus_planners.plan_shot((0, 0), 0, [(5, 280)], TALL_GRID)
+    assert len(plan) == 287 and plan[-2:] == ['Shoot', 'Wait'], plan
+    assert follow((0, 0, 0), plan[:-2], TALL_GRID) == (2, 280, 3)
+
+
+LARGE_GRID_TESTS = (test_route_past_y_255, test_shot_past_y_255,
+                    test_compiled_route_tall_grid, test_compiled_shot_tall_grid)
+
+
+def run_large_grid_tests():
+    print('\n--------------------------\nRunning Large Grid Tests:')
+    for test in LARGE_GRID_TESTS:
+        test()
+        print(f'{test.__name__}: ok')
+
+
+# -----------------------------------------------------------------------------
+# Random Grid Tests
+# -----------------------------------------------------------------------------
+
+def shortest_plan_length(initial, allowed, is_goal):
+    """
+    Length of the shortest plan from initial (x, y, heading) to a state for
+    which is_goal is true, moving Forward only into allowed, found by a
+    plain breadth-first search over (x, y, heading) tuples; None if there
+    is no such plan. Every action costs 1, so this is also the length of
+    the plans found by A* with an admissible heuristic, as the planners
+    originally did.
+    """
+    frontier, seen, depth = [initial], {initial}, 0
+    while frontier:
+        if any(is_goal(state) for state in frontier):
+            return depth
+        layer = []
+        for x, y, h in frontier:
+            moves = [(x, y, (h + 1) % 4), (x, y, (h - 1) % 4)]
+            nx, ny = x + FORWARD_STEP[h][0], y + FORWARD_STEP[h][1]
+            if (nx, ny) in allowed:
+                moves.append((nx, ny, h))
+            for state in moves:
+                if state not in seen:
+                    seen.add(state)
+                    layer.append(state)
+        frontier, depth = layer, depth + 1
+    return None
+
+
+def lined_up(state, goals):
+    """ True if one of goals lies straight ahead of state (x, y, heading) """
+    x, y, h = state
+    dx, dy = FORWARD_STEP[h]
+    return any((gx - x) * dy == (gy - y) * dx and (gx - x) * dx + (gy - y) * dy > 0
+               for gx, gy in goals)
+
+
+def random_problems(rnd, count, max_side, min_side=1):
+    """
+    count random (initials, goals, allowed): a few initial (x, y, heading)
+    states planned from in turn (so the planners reuse their problem), up
+    to three goals, and about three quarters of the cells of a grid allowed.
+    """
+    for _ in range(count):
+        width, height = rnd.randint(min_side, max_side), rnd.randint(min_side, max_side)
+        cells = [(x, y) for x in range(width) for y in range(height)]
+        allowed = set(cell for cell in cells if rnd.random() < 0.75) or set(cells)
+        goals = rnd.sample(cells, min(len(cells), rnd.randint(1, 3)))
+        initials = [(rnd.randrange(width), rnd.randrange(height), rnd.randrange(4))
+                    for _ in range(3)]
+        yield initials, goals, allowed
+
+
+def check_route(initial, goals, allowed):
+    plan = wumpus_planners.plan_route(initial[:2], initial[2], goals, allowed)
+    expected = shortest_plan_length(initial, allowed, lambda state: state[:2] in goals)
+    if expected is None:
+        assert plan == [], (initial, goals, allowed, plan)
+    else:
+        assert len(plan) == expected, (initial, goals, allowed, plan)
+        assert follow(initial, plan, allowed)[:2] in goals
+    assert list(wumpus_planners.plan_route_iter(initial[:2], initial[2], goals, allowed)) == plan
+
+
+def check_shot(initial, goals, allowed):
+    plan = wumpus_planners.plan_shot(initial[:2], initial[2], goals, allowed)
+    expected = shortest_plan_length(initial, allowed, lambda state: lined_up(state, goals))
+    if expected is None:
+        assert plan == [], (initial, goals, allowed, plan)
+    else:
+        assert len(plan) == expected + 2 and plan[-2:] == ['Shoot', 'Wait'], \
+            (initial, goals, allowed, plan)
+        assert lined_up(follow(initial, plan[:-2], allowed), goals)
+    assert list(wumpus_planners.plan_shot_iter(initial[:2], initial[2], goals, allowed)) == plan
+
+
+def test_random_routes():
+    """
+    plan_route and plan_route_iter on random grids of up to 7x7 give plans
+    of the shortest length that reach a goal.
+    """
+    for initials, goals, allowed in random_problems(random.Random(0), 150, 7):
+        for initial in initials:
+            check_route(initial, goals, allowed)
+
+
+def test_random_shots():
+    """
+    plan_shot and plan_shot_iter on random grids of up to 7x7 give plans
+    of the shortest length that line up a shot, then Shoot and Wait.
+    """
+    for initials, goals, allowed in random_problems(random.Random(1), 150, 7):
+        for initial in initials:
+            check_shot(initial, goals, allowed)
+
+
+def test_random_compiled_plans():
+    """
+    The same checks on random grids of 24x24 and up, large enough that the
+    planners use the numba-compiled search (when numba is installed).
+    """
+    for initials, goals, allowed in random_problems(random.Random(2), 8, 30, 24):
+        assert len(allowed) >= wumpus_planners._COMPILED_MIN_CELLS
+        for initial in initials:
+            check_route(initial, goals, allowed)
+            check_shot(initial, goals, allowed)
+
+
+RANDOM_GRID_TESTS = (test_random_routes, test_random_shots, test_random_compiled_plans)
+
+
+def run_random_grid_tests():
+    print('\n--------------------------\nRunning Random Grid Tests:')
+    for test in RANDOM_GRID_TESTS:
+        test()
+        print(f'{test.__name__}: ok')
+
+
 if __name__ == '__main__':
     run_prp_tests()
     run_psp_tests()
+    run_large_grid_tests()
+    run_random_grid_tests()